@@ -1,10 +1,28 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from email.header import Header
+from email.mime.text import MIMEText
+import asyncio
+import bisect
+import functools
+import io
+import itertools
 import json
+import logging
+import os
+import re
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import time
 
 # -------------------- CONFIGURATION --------------------
 st.set_page_config(
@@ -271,72 +289,2038 @@ def load_demo_data():
     
     return pd.DataFrame(demo_data)
 
-# Initialize session state
-if 'df' not in st.session_state:
-    st.session_state.df = load_demo_data()
-
-df = st.session_state.df
+# -------------------- SCHEMA --------------------
+# Column order of the prospects frame, as built by load_demo_data()
+PROSPECT_COLUMNS = [
+    "Prospect ID", "Name", "Title / Role", "Company", "Industry", "Company Size",
+    "Location", "Email", "Phone", "LinkedIn URL", "Source", "Date Added",
+    "Lead Status", "Owner", "Pain Point(s)", "Solution Interest", "Priority",
+    "Email 1 Date", "Email 1 Status", "Email 2 Date", "Email 2 Status",
+    "Email 3 Date", "Email 3 Status", "Call / Demo Date", "Deal Stage",
+    "Deal Value", "Notes", "Opened Emails", "Replies", "Last Contact",
+    "Next Follow Up", "Lead Score", "Website", "Employee Count", "Revenue", "Budget"
+]
 
-# -------------------- HELPER FUNCTIONS --------------------
+EMAIL_DATE_COLUMNS = ["Email 1 Date", "Email 2 Date", "Email 3 Date"]
+EMAIL_STATUS_COLUMNS = ["Email 1 Status", "Email 2 Status", "Email 3 Status"]
+
+DATE_COLUMNS = ["Date Added"] + EMAIL_DATE_COLUMNS + ["Call / Demo Date", "Last Contact", "Next Follow Up"]
+COUNT_COLUMNS = ["Opened Emails", "Replies"]
+NULLABLE_INT_COLUMNS = ["Lead Score", "Employee Count"]
+
+LEAD_STATUSES = ["New", "Contacted", "Opened", "Replied", "Qualified", "Not Interested"]
+DEAL_STAGES = ["Prospecting", "Meeting Scheduled", "Proposal Sent", "Negotiation", "Closed Won", "Closed Lost"]
+EMAIL_STATUSES = ["Sent", "Opened", "Clicked", "Replied"]
+# Status of an email the relay refused for good; it is not counted as sent
+EMAIL_SEND_FAILED = "Failed"
+
+# Categorical columns and their known values; values seen in the data are appended
+CATEGORY_COLUMNS = {
+    "Lead Status": LEAD_STATUSES,
+    "Deal Stage": DEAL_STAGES,
+    "Priority": ["High", "Medium", "Low"],
+    "Industry": ["Technology", "Healthcare", "Retail", "Manufacturing", "Finance", "Education", "Other"],
+    "Company Size": ["Small", "Mid", "Enterprise"],
+    "Owner": ["Rep A", "Rep B", "Rep C", "Rep D"],
+    "Source": ["LinkedIn", "Cold Email", "Referral", "Trade Show", "Webinar", "Website", "Outbound List", "Other"],
+    "Email 1 Status": EMAIL_STATUSES + [EMAIL_SEND_FAILED],
+    "Email 2 Status": EMAIL_STATUSES + [EMAIL_SEND_FAILED],
+    "Email 3 Status": EMAIL_STATUSES + [EMAIL_SEND_FAILED],
+}
+
+TEXT_COLUMNS = [
+    col for col in PROSPECT_COLUMNS
+    if col not in DATE_COLUMNS + COUNT_COLUMNS + NULLABLE_INT_COLUMNS + ["Prospect ID"]
+    and col not in CATEGORY_COLUMNS
+]
 
-def compute_advanced_metrics(df):
-    total = len(df)
-    contacted = len(df[df["Lead Status"] != "New"])
-    meetings = len(df[df["Deal Stage"] == "Meeting Scheduled"])
-    proposals = len(df[df["Deal Stage"] == "Proposal Sent"])
-    negotiations = len(df[df["Deal Stage"] == "Negotiation"])
-    closed_won = len(df[df["Deal Stage"] == "Closed Won"])
-    closed_lost = len(df[df["Deal Stage"] == "Closed Lost"])
-
-    # Email metrics
-    total_emails_sent = df[["Email 1 Status", "Email 2 Status", "Email 3 Status"]].apply(
-        lambda col: col.isin(["Sent", "Opened", "Clicked", "Replied"]).sum()
-    ).sum()
-    total_opened = df["Opened Emails"].sum()
-    total_replies = df["Replies"].sum()
-    
-    open_rate = (total_opened / total_emails_sent) * 100 if total_emails_sent > 0 else 0
-    reply_rate = (total_replies / total_emails_sent) * 100 if total_emails_sent > 0 else 0
+# Numeric shadows of the money text columns, kept alongside the display text
+MONEY_COLUMNS = {"Deal Value": "Deal Value Numeric", "Revenue": "Revenue Numeric"}
+BUDGET_COLUMNS = ("Budget Min", "Budget Max")
+DERIVED_COLUMNS = list(MONEY_COLUMNS.values()) + list(BUDGET_COLUMNS)
+
+MONEY_AMOUNT = r"\$?\s*(\d+(?:\.\d+)?)\s*([KMB]?)"
+MONEY_MULTIPLIERS = {"K": 1e3, "M": 1e6, "B": 1e9}
+
+def _blank_to_na(series):
+    # Missing or whitespace-only values become NaN. Typed dates and numbers
+    # can't hold blank strings, so they pass through untouched.
+    if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        return series
+    if not pd.api.types.is_string_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    return series.where(series.notna() & (series.astype(str).str.strip() != ""))
+
+def parse_dates(series):
+    # Text or datetimes to datetime64 with NaT for missing or unreadable values.
+    # Most values share one format and are parsed in one pass; the rest are
+    # retried one by one, so "2024-01-05" and "01/02/2024" both parse. Import
+    # validation uses this too, so every row it accepts keeps its dates.
+    values = _blank_to_na(series)
+    parsed = pd.to_datetime(values, errors="coerce")
+    retry = (parsed.isna() & values.notna()).to_numpy()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return parsed
+
+def _money_amount(amounts, suffixes):
+    amounts = pd.to_numeric(amounts, errors="coerce").to_numpy(dtype=float)
+    suffixes = suffixes.fillna("").to_numpy(dtype=object)
+    multiplier = np.select(
+        [suffixes == suffix for suffix in MONEY_MULTIPLIERS],
+        list(MONEY_MULTIPLIERS.values()),
+        default=1.0
+    )
+    return amounts * multiplier
+
+def parse_money(series):
+    # "$75,000" -> 75000.0, "$1.5M" -> 1500000.0, "" / "Unknown" -> NaN
+    text = series.astype(str).str.upper().str.replace(",", "", regex=False)
+    parts = text.str.extract(MONEY_AMOUNT)
+    return pd.Series(_money_amount(parts[0], parts[1]), index=series.index)
+
+def parse_money_range(series):
+    # "$100K-$500K" -> (100000, 500000), "$500K+" -> (500000, NaN), "$50K" -> (50000, 50000)
+    text = series.astype(str).str.upper().str.replace(",", "", regex=False)
+    parts = text.str.extract(MONEY_AMOUNT + r"\s*(?:-\s*" + MONEY_AMOUNT + r"|(\+))?")
+    low = _money_amount(parts[0], parts[1])
+    high = np.where(parts[2].notna(), _money_amount(parts[2], parts[3]), low)
+    high = np.where(parts[4].notna(), np.nan, high)
+    return pd.DataFrame({BUDGET_COLUMNS[0]: low, BUDGET_COLUMNS[1]: high}, index=series.index)
+
+def add_money_columns(df):
+    # Money text repeats heavily across rows, so each distinct string is parsed once
+    for col, numeric_col in MONEY_COLUMNS.items():
+        codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+        df[numeric_col] = parse_money(pd.Series(uniques)).to_numpy()[codes]
+    codes, uniques = pd.factorize(df["Budget"], use_na_sentinel=False)
+    df[list(BUDGET_COLUMNS)] = parse_money_range(pd.Series(uniques)).to_numpy()[codes]
+    return df
+
+def normalize_prospects(df):
+    # Coerce a raw prospects frame (demo data, form rows, imports) to native dtypes.
+    # Dates become datetime64 with NaT for missing, categories become categoricals
+    # with NaN for missing, and free-text columns are plain strings with "" for missing.
+    df = df.copy()
+    for col in PROSPECT_COLUMNS:
+        if col not in df.columns:
+            df[col] = np.nan
+
+    df["Prospect ID"] = pd.to_numeric(df["Prospect ID"], errors="coerce").astype("Int64")
+
+    for col in DATE_COLUMNS:
+        df[col] = parse_dates(df[col]).dt.normalize()
+
+    for col in COUNT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype("int64")
+
+    for col in NULLABLE_INT_COLUMNS:
+        values = _blank_to_na(df[col])
+        if not pd.api.types.is_numeric_dtype(values):
+            values = values.astype(str).str.replace(",", "", regex=False).where(values.notna())
+        df[col] = pd.to_numeric(values, errors="coerce").round().astype("Int64")
+
+    for col, known in CATEGORY_COLUMNS.items():
+        values = _blank_to_na(df[col])
+        extra = sorted(set(values.dropna().astype(str)) - set(known))
+        df[col] = pd.Categorical(values.astype(str).where(values.notna()), categories=known + extra)
+
+    for col in TEXT_COLUMNS:
+        df[col] = df[col].astype(object).where(df[col].notna(), "").astype(str)
+
+    df = add_money_columns(df)
+
+    extra_columns = [col for col in df.columns if col not in PROSPECT_COLUMNS + DERIVED_COLUMNS]
+    return df[PROSPECT_COLUMNS + extra_columns + DERIVED_COLUMNS].reset_index(drop=True)
+
+def update_prospect(df, rows, column, value):
+    # Write one value to a cell or a list of rows, or a list of values one per row;
+    # keeps the numeric shadow of money columns in sync
+    per_row = pd.api.types.is_list_like(value)
+    values = pd.Series(list(value) if per_row else [value], dtype=object)
+    if isinstance(df[column].dtype, pd.CategoricalDtype):
+        new_categories = pd.Index(values.dropna().unique()).difference(df[column].cat.categories)
+        if len(new_categories):
+            df[column] = df[column].cat.add_categories(new_categories)
+    # Per-row values are converted first: pandas won't write an object array into e.g. int64
+    df.loc[rows, column] = pd.array(values, dtype=df[column].dtype) if per_row else value
+    if column in MONEY_COLUMNS:
+        amounts = parse_money(values).to_numpy()
+        df.loc[rows, MONEY_COLUMNS[column]] = amounts if per_row else amounts[0]
+    elif column == "Budget":
+        budget = parse_money_range(values)
+        for budget_col in BUDGET_COLUMNS:
+            amounts = budget[budget_col].to_numpy()
+            df.loc[rows, budget_col] = amounts if per_row else amounts[0]
+
+def export_columns(df):
+    # Prospect data without the derived numeric columns, for display pickers and file exports
+    return df.drop(columns=[col for col in DERIVED_COLUMNS if col in df.columns])
+
+def format_date(value, default=""):
+    return value.strftime("%Y-%m-%d") if pd.notna(value) else default
+
+# -------------------- METRICS ENGINE --------------------
+class MetricsEngine:
+    # Running counters behind the pipeline metrics. The store reports every cell
+    # change and appended batch, so reading the metrics is O(1) regardless of size;
+    # rebuild() is the full-scan path and verify() checks the two agree.
+
+    def __init__(self, df):
+        self.rebuild(df)
+
+    def rebuild(self, df):
+        self.total = len(df)
+        self.status_counts = df["Lead Status"].value_counts().to_dict()
+        self.stage_counts = df["Deal Stage"].value_counts().to_dict()
+        self.emails_sent = int(sum(df[col].isin(EMAIL_STATUSES).sum() for col in EMAIL_STATUS_COLUMNS))
+        self.opened = int(df["Opened Emails"].sum())
+        self.replies = int(df["Replies"].sum())
+        self.pipeline_sum = float(df["Deal Value Numeric"].sum())
+        self.pipeline_count = int(df["Deal Value Numeric"].notna().sum())
+        self.score_sum = float(df["Lead Score"].sum())
+        self.score_count = int(df["Lead Score"].notna().sum())
+
+    def add_rows(self, rows):
+        batch = MetricsEngine(rows)
+        self.total += batch.total
+        for value, count in batch.status_counts.items():
+            self.status_counts[value] = self.status_counts.get(value, 0) + count
+        for value, count in batch.stage_counts.items():
+            self.stage_counts[value] = self.stage_counts.get(value, 0) + count
+        self.emails_sent += batch.emails_sent
+        self.opened += batch.opened
+        self.replies += batch.replies
+        self.pipeline_sum += batch.pipeline_sum
+        self.pipeline_count += batch.pipeline_count
+        self.score_sum += batch.score_sum
+        self.score_count += batch.score_count
+
+    def apply(self, column, old, new):
+        # O(1) adjustment for a single cell going from old to new
+        self.apply_many(column, pd.Series([old], dtype=object), pd.Series([new], dtype=object))
+
+    def apply_many(self, column, old, new):
+        # Adjustment for a batch of cells in one column, O(batch)
+        self._count(column, old.dropna(), -1)
+        self._count(column, new.dropna(), 1)
+
+    def _count(self, column, values, sign):
+        if column in ("Lead Status", "Deal Stage"):
+            counts = self.status_counts if column == "Lead Status" else self.stage_counts
+            for value, count in values.value_counts().items():
+                counts[value] = counts.get(value, 0) + sign * int(count)
+        elif column in EMAIL_STATUS_COLUMNS:
+            self.emails_sent += sign * int(values.isin(EMAIL_STATUSES).sum())
+        elif column == "Opened Emails":
+            self.opened += sign * int(values.sum())
+        elif column == "Replies":
+            self.replies += sign * int(values.sum())
+        elif column == "Deal Value Numeric":
+            self.pipeline_sum += sign * float(values.astype(float).sum())
+            self.pipeline_count += sign * len(values)
+        elif column == "Lead Score":
+            self.score_sum += sign * float(values.astype(float).sum())
+            self.score_count += sign * len(values)
+
+    def snapshot(self):
+        stage = lambda name: self.stage_counts.get(name, 0)
+        contacted = self.total - self.status_counts.get("New", 0)
+        meetings = stage("Meeting Scheduled")
+        proposals = stage("Proposal Sent")
+        closed_won = stage("Closed Won")
+        sent = self.emails_sent
+
+        open_rate = (self.opened / sent) * 100 if sent > 0 else 0
+        reply_rate = (self.replies / sent) * 100 if sent > 0 else 0
+        contact_to_meeting = (meetings / contacted) * 100 if contacted > 0 else 0
+        meeting_to_proposal = (proposals / meetings) * 100 if meetings > 0 else 0
+        proposal_to_close = (closed_won / proposals) * 100 if proposals > 0 else 0
+        avg_deal = self.pipeline_sum / self.pipeline_count if self.pipeline_count > 0 else 0
+        avg_lead_score = self.score_sum / self.score_count if self.score_count > 0 else np.nan
+
+        return {
+            "total": self.total,
+            "contacted": contacted,
+            "meetings": meetings,
+            "proposals": proposals,
+            "negotiations": stage("Negotiation"),
+            "closed_won": closed_won,
+            "closed_lost": stage("Closed Lost"),
+            "total_emails_sent": int(sent),
+            "total_opened": int(self.opened),
+            "total_replies": int(self.replies),
+            "open_rate": round(open_rate, 1),
+            "reply_rate": round(reply_rate, 1),
+            "contact_to_meeting": round(contact_to_meeting, 1),
+            "meeting_to_proposal": round(meeting_to_proposal, 1),
+            "proposal_to_close": round(proposal_to_close, 1),
+            "avg_deal": round(avg_deal, 2),
+            "total_pipeline": round(self.pipeline_sum, 2),
+            "avg_lead_score": round(avg_lead_score, 1)
+        }
 
-    # Conversion rates
-    contact_to_meeting = (meetings / contacted) * 100 if contacted > 0 else 0
-    meeting_to_proposal = (proposals / meetings) * 100 if meetings > 0 else 0
-    proposal_to_close = (closed_won / proposals) * 100 if proposals > 0 else 0
+    def verify(self, df):
+        # Compare the running counters against a full rebuild; returns the mismatched keys
+        expected = compute_advanced_metrics(df)
+        actual = self.snapshot()
+        return [key for key in expected if not np.isclose(expected[key], actual[key], equal_nan=True)]
+
+# -------------------- FOLLOW-UP SCHEDULE --------------------
+class FollowUpSchedule:
+    # Rows ordered by Next Follow Up, as a sorted list of (date in ns, row) keys.
+    # Queries are a bisect plus a slice; follow-up writes move a single key.
+    # Queries run without the store lock, so writers build a new list and swap
+    # it in, and queries take the caller's row count to skip rows appended
+    # after the caller's frame.
+
+    def __init__(self, df):
+        self._keys = []
+        self.add(df)
+
+    def add(self, rows):
+        dates = rows["Next Follow Up"]
+        scheduled = dates.notna().to_numpy()
+        stamps = dates.to_numpy(dtype="datetime64[ns]")[scheduled].view("int64")
+        keys = sorted(zip(stamps.tolist(), rows.index[scheduled].tolist()))
+        if len(keys) * 16 < len(self._keys):
+            # A small batch (e.g. one new lead) is inserted into a copy rather than re-sorting everything
+            merged = list(self._keys)
+            for key in keys:
+                bisect.insort(merged, key)
+        else:
+            merged = sorted(self._keys + keys)
+        self._keys = merged
+
+    def move_many(self, rows, old_dates, new_dates):
+        keys = list(self._keys)
+        for row, old_date, new_date in zip(rows, old_dates, new_dates):
+            if pd.notna(old_date):
+                key = (pd.Timestamp(old_date).value, row)
+                pos = bisect.bisect_left(keys, key)
+                if pos < len(keys) and keys[pos] == key:
+                    del keys[pos]
+            if pd.notna(new_date):
+                bisect.insort(keys, (pd.Timestamp(new_date).value, row))
+        self._keys = keys
+
+    def due_from(self, date, size, limit=None):
+        # Rows below size with a follow-up on or after date, soonest first
+        keys = self._keys
+        start = bisect.bisect_left(keys, (pd.Timestamp(date).value, -1))
+        rows = []
+        for _, row in itertools.islice(keys, start, None):
+            if row < size:
+                rows.append(row)
+                if len(rows) == limit:
+                    break
+        return rows
+
+    def due_by(self, date, size):
+        # Rows below size with a follow-up on or before date, oldest first
+        keys = self._keys
+        end = bisect.bisect_right(keys, (pd.Timestamp(date).value, float("inf")))
+        return [row for _, row in keys[:end] if row < size]
+
+# -------------------- DATE INDEX --------------------
+class DateIndex:
+    # Rows ordered by one date column: an argsort permutation of the dated rows
+    # plus their sorted datetime64 values. Range queries and time buckets are
+    # binary searches over the sorted values instead of full-column scans.
+    # The two arrays are replaced together as one (dates, order) tuple, so
+    # readers that don't hold the store lock always see a matching pair.
+
+    def __init__(self, df, column):
+        self.column = column
+        self.size = 0
+        self.sorted = (np.empty(0, dtype="datetime64[ns]"), np.empty(0, dtype=np.int64))
+        self.add(df)
+
+    @property
+    def dates(self):
+        return self.sorted[0]
+
+    def add(self, rows):
+        dates = rows[self.column]
+        dated = dates.notna().to_numpy()
+        values = dates.to_numpy(dtype="datetime64[ns]")[dated]
+        sort = np.argsort(values, kind="stable")
+        # Merge the sorted batch in by binary search instead of re-sorting all rows
+        old_dates, old_order = self.sorted
+        at = np.searchsorted(old_dates, values[sort], side="right")
+        self.sorted = (
+            np.insert(old_dates, at, values[sort]),
+            np.insert(old_order, at, rows.index.to_numpy(dtype=np.int64)[dated][sort]),
+        )
+        self.size = max(self.size, int(rows.index.max()) + 1) if len(rows) else self.size
+
+    def rows_between(self, start, end):
+        # Rows dated within [start, end], oldest first
+        dates, order = self.sorted
+        lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start), "ns"), side="left")
+        hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end), "ns"), side="right")
+        return order[lo:hi]
+
+    def mask_between(self, start, end, size=None):
+        # Boolean mask over the first size rows (all rows by default)
+        size = self.size if size is None else size
+        rows = self.rows_between(start, end)
+        mask = np.zeros(size, dtype=bool)
+        mask[rows[rows < size]] = True
+        return mask
+
+    def counts_by(self, freq):
+        # Rows per calendar period (e.g. "W"), for the periods that have any
+        dates = self.dates
+        if len(dates) == 0:
+            return pd.Series(dtype=np.int64)
+        periods = pd.period_range(
+            pd.Timestamp(dates[0]).to_period(freq), pd.Timestamp(dates[-1]).to_period(freq), freq=freq
+        )
+        bounds = np.append(periods.start_time.to_numpy(dtype="datetime64[ns]"), dates[-1] + np.timedelta64(1, "ns"))
+        counts = pd.Series(np.diff(np.searchsorted(dates, bounds, side="left")), index=periods)
+        return counts[counts > 0]
+
+# -------------------- FILTER INDEX --------------------
+# Columns behind the multiselect filters
+FILTER_COLUMNS = ["Lead Status", "Industry", "Owner", "Priority", "Deal Stage"]
+
+class BitmapIndex:
+    # One packed bitmap per value of each filter column (bit r set when row r
+    # holds the value), plus per-value row counts for the distinct-value lists.
+    # A filter is an OR of bitmaps within a column and an AND across columns.
+    #
+    # select() runs without the store lock, so writers never change a bitmap
+    # or count dict a reader may hold: they build new ones and swap them in,
+    # and size only grows once every bitmap is long enough for it.
+
+    def __init__(self, df):
+        self.size = 0
+        self.bitmaps = {col: {} for col in FILTER_COLUMNS}
+        self.counts = {col: {} for col in FILTER_COLUMNS}
+        self.add(df)
+
+    def add(self, rows):
+        size = max(self.size, int(rows.index.max()) + 1) if len(rows) else self.size
+        nbytes = (size + 7) // 8
+        for col in FILTER_COLUMNS:
+            bitmaps = self.bitmaps[col]
+            for value, bitmap in list(bitmaps.items()):
+                if len(bitmap) < nbytes:
+                    bitmaps[value] = np.concatenate([bitmap, np.zeros(nbytes - len(bitmap), dtype=np.uint8)])
+            self._set(col, rows.index.to_numpy(dtype=np.int64), rows[col], nbytes)
+        self.size = size
+
+    def update(self, column, rows, old, new):
+        rows = np.asarray(rows, dtype=np.int64)
+        nbytes = (self.size + 7) // 8
+        self._clear(column, rows, old, nbytes)
+        self._set(column, rows, new, nbytes)
+
+    def values(self, column):
+        # Values present in the data, in vocabulary order
+        counts = self.counts[column]
+        return [value for value, count in counts.items() if count > 0]
+
+    def select(self, filters, size=None):
+        # Boolean mask over the first size rows (all rows by default) for
+        # {column: accepted values}; None accepts any value
+        current = self.size
+        nbytes = (current + 7) // 8
+        packed = np.full(nbytes, 0xFF, dtype=np.uint8)
+        for col, accepted in filters.items():
+            if accepted is None:
+                continue
+            column = self.bitmaps[col]
+            bitmaps = [column[value][:nbytes] for value in accepted if value in column]
+            packed &= np.bitwise_or.reduce(bitmaps) if bitmaps else 0
+        count = current if size is None else size
+        return np.unpackbits(packed, count=count, bitorder="little").view(bool)
+
+    def _set(self, column, rows, values, nbytes):
+        self._group(column, rows, values, np.bitwise_or.at, 1, nbytes)
+
+    def _clear(self, column, rows, values, nbytes):
+        self._group(column, rows, values, np.bitwise_and.at, -1, nbytes)
+
+    def _group(self, column, rows, values, combine, sign, nbytes):
+        values = pd.Series(np.asarray(values, dtype=object))
+        present = values.notna().to_numpy()
+        codes, uniques = pd.factorize(values[present])
+        uniques = uniques.tolist()
+        rows = rows[present]
+        bitmaps, counts = self.bitmaps[column], self._order(column, uniques)
+        for code, value in enumerate(uniques):
+            value_rows = rows[codes == code]
+            bits = (np.uint8(1) << (value_rows & 7).astype(np.uint8)).astype(np.uint8)
+            bitmap = bitmaps[value].copy() if value in bitmaps else np.zeros(nbytes, dtype=np.uint8)
+            combine(bitmap, value_rows >> 3, bits if sign > 0 else ~bits)
+            bitmaps[value] = bitmap
+            counts[value] = counts.get(value, 0) + sign * len(value_rows)
+        self.counts[column] = counts
+
+    def _order(self, column, new_values):
+        # A new counts dict, in vocabulary order then first-seen order for other values
+        counts = self.counts[column]
+        if all(value in counts for value in new_values):
+            return dict(counts)
+        known = CATEGORY_COLUMNS.get(column, [])
+        extra = [value for value in list(counts) + list(new_values) if value not in known]
+        ordered = [value for value in known if value in counts or value in new_values]
+        ordered += list(dict.fromkeys(extra))
+        return {value: counts.get(value, 0) for value in ordered}
+
+# -------------------- TEXT SEARCH INDEX --------------------
+SEARCH_WORD = re.compile(r"\w+")
+
+# Column groups that are indexed separately, so a contact search isn't diluted by notes
+SEARCH_INDEXES = {"contact": ["Name", "Company", "Email"], "notes": ["Notes"]}
+
+class TextIndex:
+    # Inverted index for case-insensitive substring search. Each word maps to the
+    # rows containing it, and a trigram index over the vocabulary finds the words
+    # containing a query fragment, so a search only touches rows that can match.
+    # Candidates are a superset: callers confirm the substring on those rows.
+    # A word's rows are a few sorted chunks, each at least twice the size of the
+    # next, so repeated edits of one row stay O(log n) chunks instead of piling up.
+
+    def __init__(self, df, columns):
+        self.columns = columns
+        self.postings = {}
+        self.grams = defaultdict(set)
+        self.add(df)
+
+    def add(self, rows):
+        # Index rows (new or rewritten); stale words stay behind as harmless false candidates
+        words = pd.concat([
+            rows[col].astype(str).str.lower().str.findall(SEARCH_WORD).explode() for col in self.columns
+        ]).dropna()
+        if words.empty:
+            return
+        pairs = pd.DataFrame({"row": words.index.to_numpy(dtype=np.int64), "word": words.to_numpy()}).drop_duplicates()
+        codes, vocabulary = pd.factorize(pairs["word"])
+        order = np.argsort(codes, kind="stable")
+        sorted_rows = pairs["row"].to_numpy()[order]
+        boundaries = (np.flatnonzero(np.diff(codes[order])) + 1).tolist()
+        for word, start, end in zip(vocabulary.tolist(), [0] + boundaries, boundaries + [len(sorted_rows)]):
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = []
+                for i in range(len(word) - 2):
+                    self.grams[word[i:i + 3]].add(word)
+            postings.append(sorted_rows[start:end])
+            while len(postings) > 1 and len(postings[-1]) * 2 > len(postings[-2]):
+                postings[-2:] = [np.union1d(postings[-2], postings[-1])]
+
+    def candidates(self, term):
+        # Rows that may contain term, or None if the term has no word characters
+        fragments = SEARCH_WORD.findall(term.lower())
+        if not fragments:
+            return None
+        result = None
+        for fragment in fragments:
+            rows = self._rows_containing(fragment)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        return result
+
+    def _rows_containing(self, fragment):
+        if len(fragment) >= 3:
+            word_sets = sorted((self.grams.get(fragment[i:i + 3], set()) for i in range(len(fragment) - 2)), key=len)
+            words = [word for word in word_sets[0].intersection(*word_sets[1:]) if fragment in word]
+        else:
+            words = [word for word in self.postings if fragment in word]
+        chunks = [chunk for word in words for chunk in self.postings[word]]
+        return np.unique(np.concatenate(chunks)) if chunks else np.empty(0, dtype=np.int64)
+
+# -------------------- DUPLICATE INDEX --------------------
+# How an upload row that matches an existing prospect is handled
+DEDUPE_POLICIES = {"keep": "Keep existing", "overwrite": "Overwrite with upload", "fill": "Fill blanks only"}
+DEDUPE_COLUMNS = ["Name", "Company", "Email", "Website"]
+
+# Mailbox providers say nothing about the company, so they don't count as a company domain
+FREE_MAIL_DOMAINS = {"gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "aol.com", "icloud.com", "proton.me"}
+
+def _key_text(frame, column):
+    if column not in frame.columns:
+        return pd.Series("", index=frame.index, dtype=str)
+    return frame[column].astype(object).where(frame[column].notna(), "").astype(str).str.strip().str.lower()
+
+def _filled(values):
+    # Cells holding a value: not missing and not blank text
+    return (values.notna() & (values.astype(str).str.strip() != "")).to_numpy()
+
+def email_keys(frame):
+    # " Ann@Acme.com " -> "ann@acme.com"; anything without an @ -> NaN
+    emails = _key_text(frame, "Email")
+    return emails.where(emails.str.contains("@", regex=False))
+
+def person_keys(frame):
+    # "Ann  Lee" at https://www.acme.com/about -> "ann lee|acme.com". The company
+    # domain comes from Website, else a non-free email domain, else the company name.
+    name = _key_text(frame, "Name").str.replace(r"[^\w\s]", "", regex=True).str.replace(r"\s+", " ", regex=True)
+    website = _key_text(frame, "Website").str.replace(r"^(?:https?://)?(?:www\.)?([^/]*).*$", r"\1", regex=True)
+    mail_domain = email_keys(frame).str.replace(r"^[^@]*@", "", regex=True)
+    mail_domain = mail_domain.where(~mail_domain.isin(FREE_MAIL_DOMAINS))
+    company = _key_text(frame, "Company").str.replace(r"[^\w]", "", regex=True)
+    domain = website.where(website != "", mail_domain).fillna(company)
+    return (name + "|" + domain).where((name != "") & (domain != ""))
+
+class DuplicateIndex:
+    # Hash maps from normalized email and from (name, company domain) to the
+    # first row holding that key, so matching a row is two dict lookups
+    # whatever the size of the book.
+
+    def __init__(self, df):
+        self.emails = {}
+        self.people = {}
+        self.add(df)
+
+    def add(self, rows):
+        for keys, index in ((email_keys(rows), self.emails), (person_keys(rows), self.people)):
+            present = keys.notna()
+            for key, row in zip(keys[present].tolist(), rows.index[present].tolist()):
+                index.setdefault(key, row)
+
+    def update(self, old, new):
+        # Re-key rows whose identifying columns changed (old/new: frames indexed by row)
+        for keys, index in ((email_keys(old), self.emails), (person_keys(old), self.people)):
+            for key, row in zip(keys.tolist(), old.index.tolist()):
+                if index.get(key) == row:
+                    del index[key]
+        self.add(new)
+
+    def match(self, rows):
+        # Existing row for each of rows by email, then by person; -1 where there is none
+        emails, people = email_keys(rows).tolist(), person_keys(rows).tolist()
+        return np.array([
+            self.emails.get(email, self.people.get(person, -1)) for email, person in zip(emails, people)
+        ], dtype=np.int64)
+
+# -------------------- PROSPECT DATABASE --------------------
+# Prospects persist in a local SQLite file; set CRM_DB_PATH to move it
+CRM_DB_PATH = os.environ.get("CRM_DB_PATH", "crm.db")
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+def _sql_value(value):
+    if value is None or value is pd.NaT or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _sql_rows(rows):
+    # Prospect rows as parameter tuples, dates as ISO text and missing values as NULL
+    columns = []
+    for col in PROSPECT_COLUMNS:
+        values = rows[col].dt.strftime("%Y-%m-%d") if col in DATE_COLUMNS else rows[col]
+        columns.append(values.astype(object).where(rows[col].notna(), None).tolist())
+    return list(zip(*columns))
+
+class ProspectDB:
+    # SQLite storage for the prospects table, in WAL mode so readers never block
+    # the writer. Every statement is parameterized, and writes grouped under
+    # batch() commit as one transaction. Rows carry a _version column stamped
+    # with the store version that last wrote them. Filters, counts and
+    # aggregates are served by the store's in-memory indexes, so the only
+    # lookups here are by Prospect ID and _version and no column is indexed.
+
+    def __init__(self, path=CRM_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.depth = 0
+        self._create()
+
+    def _create(self):
+        columns = [f'{_quote("Prospect ID")} INTEGER PRIMARY KEY'] + [
+            f"{_quote(col)} {self._type(col)}" for col in PROSPECT_COLUMNS if col != "Prospect ID"
+        ] + ["_version INTEGER NOT NULL DEFAULT 0"]
+        with self.batch():
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS prospects ({', '.join(columns)})")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_prospects_version ON prospects (_version)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS completed_tasks "
+                "(prospect_id INTEGER, type TEXT, anchor TEXT, PRIMARY KEY (prospect_id, type, anchor))"
+            )
 
-    # Deal value calculations
-    def parse_value(x):
+    def _type(self, column):
+        if column in COUNT_COLUMNS + NULLABLE_INT_COLUMNS:
+            return "INTEGER"
+        return "TEXT"
+
+    @contextmanager
+    def batch(self):
+        # One transaction for everything written inside; nested batches join the outer one
+        if self.depth == 0:
+            self.conn.execute("BEGIN IMMEDIATE")
+        self.depth += 1
         try:
-            return float(str(x).replace("$", "").replace(",", "").replace("K", "000").replace("M", "000000"))
-        except:
-            return np.nan
+            yield self.conn
+        except BaseException:
+            self.depth -= 1
+            if self.depth == 0:
+                self.conn.execute("ROLLBACK")
+            raise
+        self.depth -= 1
+        if self.depth == 0:
+            self.conn.execute("COMMIT")
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM prospects").fetchone()[0]
+
+    def version(self):
+        # Last version committed. Every write records it in meta alongside its rows,
+        # so it never goes backwards even when the rows carrying it are overwritten
+        stored = self.conn.execute("SELECT COALESCE(MAX(_version), 0) FROM prospects").fetchone()[0]
+        return max(stored, int(self.get_meta("version", 0)))
+
+    def load(self):
+        columns = ", ".join(_quote(col) for col in PROSPECT_COLUMNS)
+        query = f"SELECT {columns} FROM prospects ORDER BY {_quote('Prospect ID')}"
+        return normalize_prospects(pd.read_sql_query(query, self.conn))
+
+    def insert(self, rows, version):
+        columns = ", ".join(_quote(col) for col in PROSPECT_COLUMNS)
+        marks = ", ".join("?" * (len(PROSPECT_COLUMNS) + 1))
+        with self.batch():
+            self.conn.executemany(
+                f"INSERT INTO prospects ({columns}, _version) VALUES ({marks})",
+                [row + (version,) for row in _sql_rows(rows)]
+            )
+            self.set_meta("version", version)
+
+    def update(self, prospect_ids, column, values, version):
+        # values holds one value per prospect
+        statement = f"UPDATE prospects SET {_quote(column)} = ?, _version = ? WHERE {_quote('Prospect ID')} = ?"
+        with self.batch():
+            self.conn.executemany(
+                statement, [(_sql_value(value), version, int(pid)) for pid, value in zip(prospect_ids, values)]
+            )
+            self.set_meta("version", version)
+
+    def replace_all(self, rows, version):
+        with self.batch():
+            self.conn.execute("DELETE FROM prospects")
+            self.insert(rows, version)
+            self.set_meta("reset_version", version)
+
+    def ids_changed_since(self, version):
+        # Prospect IDs of rows written after version, served by the _version index
+        query = f"SELECT {_quote('Prospect ID')} FROM prospects WHERE _version > ?"
+        return [row[0] for row in self.conn.execute(query, (version,))]
+
+    def completed_tasks(self):
+        # (Prospect ID, task type, anchor date) of every completed task
+        rows = self.conn.execute("SELECT prospect_id, type, anchor FROM completed_tasks").fetchall()
+        return {(pid, task_type, pd.Timestamp(anchor)) for pid, task_type, anchor in rows}
+
+    def complete_tasks(self, keys):
+        with self.batch():
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO completed_tasks (prospect_id, type, anchor) VALUES (?, ?, ?)",
+                [(int(pid), task_type, _sql_value(anchor)) for pid, task_type, anchor in keys]
+            )
 
-    deal_values = df["Deal Value"].apply(parse_value)
-    avg_deal = deal_values.mean()
-    total_pipeline = deal_values.sum()
-    
-    # Lead scoring
-    avg_lead_score = df["Lead Score"].mean()
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_meta(self, key, value):
+        with self.batch():
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+# -------------------- PROSPECT STORE --------------------
+# Charts and aggregates memoized per (data version, parameters); entries from
+# older versions are evicted first, then the least recently used
+VIEW_CACHE_SIZE = 64
+
+class AppendFrame:
+    # The prospects frame as column arrays with room to grow, so appending rows
+    # copies only those rows. Dates, numbers and category codes sit in numpy
+    # arrays whose capacity doubles when full; text columns are Arrow chunks,
+    # merged whenever a chunk is over half the size of the one before it.
+    # frame() wraps the first size rows without copying. Nothing below size is
+    # written again, so frames already handed out never change.
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.columns = {col: self._adopt(df[col].array) for col in df.columns}
+
+    def adopt(self, df, columns):
+        # Take over columns that a copy-on-write update replaced in df
+        for col in columns:
+            self.columns[col] = self._adopt(df[col].array)
+
+    def frame(self):
+        return pd.DataFrame({col: self._wrap(column) for col, column in self.columns.items()}, copy=False)
+
+    def append(self, rows):
+        start, end = self.size, self.size + len(rows)
+        for col, column in self.columns.items():
+            self._extend(column, rows[col].array, start, end)
+        self.size = end
+
+    def _adopt(self, array):
+        if isinstance(array, pd.arrays.ArrowStringArray):
+            import pyarrow as pa
+            chunk = pa.array(array)
+            return {"kind": "text", "chunks": [chunk] if len(chunk) else [], "type": chunk.type,
+                    "cls": type(array), "dtype": array.dtype}
+        if isinstance(array, pd.Categorical):
+            return {"kind": "category", "values": array.codes, "dtype": array.dtype}
+        if isinstance(array, pd.arrays.IntegerArray):
+            return {"kind": "masked", "values": array.to_numpy(array.dtype.numpy_dtype, na_value=0),
+                    "mask": array.isna(), "dtype": array.dtype}
+        if isinstance(array, pd.arrays.NumpyExtensionArray) or (
+            isinstance(array, pd.arrays.DatetimeArray) and array.tz is None
+        ):
+            return {"kind": "numpy", "values": np.asarray(array)}
+        # Anything else is concatenated on append, copying that column
+        return {"kind": "array", "values": array}
+
+    def _wrap(self, column):
+        kind, size = column["kind"], self.size
+        if kind == "text":
+            import pyarrow as pa
+            chunks = pa.chunked_array(column["chunks"], type=column["type"])
+            return column["cls"](chunks, dtype=column["dtype"])
+        if kind == "category":
+            return pd.Categorical.from_codes(column["values"][:size], dtype=column["dtype"], validate=False)
+        if kind == "masked":
+            return pd.arrays.IntegerArray(column["values"][:size], column["mask"][:size])
+        return column["values"][:size]
+
+    def _extend(self, column, new, start, end):
+        kind = column["kind"]
+        if kind == "text":
+            import pyarrow as pa
+            chunks = column["chunks"]
+            chunk = pa.array(new).cast(column["type"])
+            if len(chunk):
+                chunks.append(chunk)
+            while len(chunks) > 1 and len(chunks[-1]) * 2 > len(chunks[-2]):
+                chunks[-2:] = [pa.concat_arrays(chunks[-2:])]
+            return
+        if kind == "array":
+            column["values"] = pd.concat([pd.Series(column["values"]), pd.Series(new)], ignore_index=True).array
+            return
+        if kind == "category":
+            # New values extend the categories; codes already stored stay valid
+            categories = column["dtype"].categories.union(new.categories, sort=False)
+            if len(categories) > len(column["dtype"].categories):
+                column["dtype"] = pd.CategoricalDtype(categories)
+                codes_dtype = pd.Categorical([], categories=categories).codes.dtype
+                if codes_dtype != column["values"].dtype:
+                    column["values"] = column["values"].astype(codes_dtype)
+            values = new.set_categories(categories).codes
+        elif kind == "masked":
+            values = new.to_numpy(column["dtype"].numpy_dtype, na_value=0)
+            column["mask"] = self._grow(column["mask"], start, end)
+            column["mask"][start:end] = new.isna()
+        else:
+            values = np.asarray(new).astype(column["values"].dtype, copy=False)
+        column["values"] = self._grow(column["values"], start, end)
+        column["values"][start:end] = values
+
+    @staticmethod
+    def _grow(values, start, end):
+        # values if it has room for end rows, else a copy of its first start rows with double the room
+        if end <= len(values):
+            return values
+        grown = np.empty(max(end, 2 * len(values)), dtype=values.dtype)
+        grown[:start] = values[:start]
+        return grown
+
+class ProspectStore:
+    # The prospects frame loaded from the database, plus the state derived from it.
+    # Every write goes through update()/update_many()/append()/reset(), which
+    # write through to the database and keep derived state in step. Rows are
+    # addressed by position; self.ids maps Prospect ID to it.
+    #
+    # One store is shared by every session (see get_store()). Writers hold
+    # self.lock, and self.df is copy-on-write: a write publishes a new frame
+    # and never changes one a session already holds, so a rerun reads a stable
+    # frame without locking. The filter and date indexes are read unlocked
+    # too, and swap in new arrays rather than changing ones a reader holds.
+    # Short of a reset, rows are only ever appended, so positions in an older
+    # frame stay valid in newer ones.
+    #
+    # The columns live in an AppendFrame, so an insert costs the size of the
+    # batch rather than a copy of the table, however often self.df is read.
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.RLock()
+        self.version = db.version()
+        self.completed_tasks = db.completed_tasks()
+        self._rebuild(db.load())
+
+    def reset(self, df):
+        # Replace every prospect, on disk and in memory
+        with self.lock:
+            self.version += 1
+            self.db.replace_all(df, self.version)
+            self._rebuild(df)
+
+    @property
+    def df(self):
+        return self._df
+
+    def _rebuild(self, df):
+        # Only schema columns are kept, as append() does
+        self._columns = AppendFrame(df[PROSPECT_COLUMNS + DERIVED_COLUMNS].reset_index(drop=True))
+        df = self._df = self._columns.frame()
+        self.size = len(df)
+        self.ids = dict(zip(df["Prospect ID"].tolist(), range(len(df))))
+        self.next_id = int(df["Prospect ID"].max()) + 1 if len(df) else 1
+        self.metrics = MetricsEngine(df)
+        self.followups = FollowUpSchedule(df)
+        self.filters = BitmapIndex(df)
+        self.date_added = DateIndex(df, "Date Added")
+        self._views = OrderedDict()
+        self._text_indexes = {}
+        self._duplicates = None
+
+    def row_for(self, prospect_id):
+        return self.ids[prospect_id]
+
+    def rows_for(self, prospect_ids):
+        return [self.ids[prospect_id] for prospect_id in prospect_ids]
+
+    def update(self, idx, column, value):
+        self.update_many([idx], column, value)
+
+    def update_many(self, rows, column, value):
+        if len(rows) == 0:
+            return
+        with self._transaction():
+            self._update_many(rows, column, value)
+
+    @contextmanager
+    def _transaction(self):
+        # One database transaction under the lock. Memory is written as it goes,
+        # so if the transaction fails it is reloaded from the rolled-back database
+        with self.lock:
+            try:
+                with self.db.batch():
+                    yield
+            except BaseException:
+                if self.db.depth == 0:
+                    self._rebuild(self.db.load())
+                raise
+
+    def _update_many(self, rows, column, value):
+        touched = [column] + self._shadow_columns(column)
+        old = self.df.loc[rows, touched]
+        rekey = self._duplicates is not None and column in DEDUPE_COLUMNS
+        if rekey:
+            old_keys = self.df.loc[rows, DEDUPE_COLUMNS]
+        # Shallow copy first: under copy-on-write (pandas 3) only the written
+        # columns are copied, leaving readers' frame intact
+        df = self.df.copy(deep=False)
+        update_prospect(df, rows, column, value)
+        self._columns.adopt(df, touched)
+        self._df = df
+        new = self.df.loc[rows, touched]
+        self.version += 1
+        self.db.update(self.df.loc[rows, "Prospect ID"].tolist(), column, new[column].tolist(), self.version)
+        for col in touched:
+            self.metrics.apply_many(col, old[col], new[col])
+        if column == "Next Follow Up":
+            self.followups.move_many(rows, old[column], new[column])
+        if column in FILTER_COLUMNS:
+            self.filters.update(column, rows, old[column], new[column])
+        if column == self.date_added.column:
+            self.date_added = DateIndex(self.df, self.date_added.column)
+        for index in self._text_indexes.values():
+            if column in index.columns:
+                index.add(self.df.loc[rows])
+        if rekey:
+            self._duplicates.update(old_keys, self.df.loc[rows, DEDUPE_COLUMNS])
+
+    def merge(self, rows, incoming, filled, policy):
+        # Copy values from incoming (normalized, one row per entry of rows) onto
+        # existing rows. filled maps each column to merge to the cells that were
+        # non-blank in the upload, before normalizing turned blank counts into 0.
+        # "overwrite" takes every filled value; "fill" only fills cells that are
+        # blank on the existing row, where a count of 0 counts as blank.
+        rows = np.asarray(rows, dtype=np.int64)
+        with self._transaction():
+            for col, take in filled.items():
+                values = incoming[col]
+                if policy == "fill":
+                    existing = self.df.loc[rows, col]
+                    blank = ~_filled(existing)
+                    if col in COUNT_COLUMNS:
+                        blank = blank | (existing == 0).to_numpy()
+                    take = take & blank
+                if take.any():
+                    self._update_many(rows[take].tolist(), col, values[take].tolist())
+
+    def complete_tasks(self, keys):
+        # Task keys (see task_keys()) to hide from the task list, kept on disk
+        keys = [(int(pid), task_type, pd.Timestamp(anchor)) for pid, task_type, anchor in keys]
+        with self.lock:
+            self.db.complete_tasks(keys)
+            self.completed_tasks = self.completed_tasks | set(keys)
+
+    def find_duplicates(self, rows):
+        # Existing row matching each of rows (see DuplicateIndex.match), -1 for none
+        with self.lock:
+            if self._duplicates is None:
+                self._duplicates = DuplicateIndex(self.df)
+            return self._duplicates.match(rows)
+
+    def find_duplicate(self, record):
+        row = self.find_duplicates(pd.DataFrame([record]))[0]
+        return None if row < 0 else int(row)
+
+    def launch_campaign(self, rows, send_date, status="Sent"):
+        # Put the campaign email in each target's first free Email N slot, one
+        # bulk write per slot, and move emailed New leads to Contacted. status is
+        # one value or one per row; a failed send records its status but leaves
+        # the slot's date empty, so the slot stays free for the next campaign
+        with self._transaction():
+            rows = np.asarray(rows, dtype=np.int64)
+            return self._record_sends(rows, self.free_slots(rows), send_date, status)
+
+    def record_sends(self, rows, slots, send_date, status):
+        # launch_campaign() into slots chosen beforehand, e.g. by a queued campaign job
+        with self._transaction():
+            return self._record_sends(np.asarray(rows, dtype=np.int64), np.asarray(slots, dtype=np.int64), send_date, status)
+
+    def free_slots(self, rows, reserved=None):
+        # First free Email N slot (0-2) of each row, or 3 when all are used.
+        # reserved is an optional boolean array (rows x slots) of slots to treat as taken
+        free = self.df.loc[rows, EMAIL_DATE_COLUMNS].isna().to_numpy()
+        if reserved is not None:
+            free = free & ~reserved
+        return np.where(free.any(axis=1), np.argmax(free, axis=1), len(EMAIL_DATE_COLUMNS))
+
+    def _record_sends(self, rows, slot, send_date, status):
+        statuses = np.broadcast_to(np.asarray(status, dtype=object), rows.shape)
+        has_slot = slot < len(EMAIL_DATE_COLUMNS)
+        delivered = has_slot & (statuses != EMAIL_SEND_FAILED)
+
+        summary = {"targets": len(rows), "sent": int(delivered.sum()), "failed": int((has_slot & ~delivered).sum())}
+        for i, (date_col, status_col) in enumerate(zip(EMAIL_DATE_COLUMNS, EMAIL_STATUS_COLUMNS)):
+            in_slot = slot == i
+            self.update_many(rows[in_slot & delivered].tolist(), date_col, pd.Timestamp(send_date))
+            self.update_many(rows[in_slot].tolist(), status_col, statuses[in_slot].tolist())
+            summary[f"Email {i + 1}"] = int((in_slot & delivered).sum())
+        summary["skipped"] = int((~has_slot).sum())
+
+        emailed = rows[delivered]
+        is_new = (self.df.loc[emailed, "Lead Status"] == "New").to_numpy()
+        self.update_many(emailed[is_new].tolist(), "Lead Status", "Contacted")
+        return summary
+
+    def append(self, rows):
+        # Only schema columns are stored, so memory matches what is on disk
+        rows = normalize_prospects(rows)[PROSPECT_COLUMNS + DERIVED_COLUMNS]
+        with self.lock:
+            return self._append(rows)
+
+    def _append(self, rows):
+        rows.index = pd.RangeIndex(self.size, self.size + len(rows))
+        self._assign_ids(rows)
+        self.version += 1
+        self.db.insert(rows, self.version)
+        self._columns.append(rows)
+        self._df = self._columns.frame()
+        self.size += len(rows)
+        self.ids.update(zip(rows["Prospect ID"].tolist(), rows.index.tolist()))
+        self.metrics.add_rows(rows)
+        self.followups.add(rows)
+        self.filters.add(rows)
+        self.date_added.add(rows)
+        for index in self._text_indexes.values():
+            index.add(rows)
+        if self._duplicates is not None:
+            self._duplicates.add(rows)
+        return rows
+
+    def search(self, term, mask, groups=("contact",)):
+        # Positions of rows within mask (a boolean array over the caller's rows)
+        # whose indexed columns contain term, case-insensitively
+        columns = [col for group in groups for col in SEARCH_INDEXES[group]]
+        with self.lock:
+            found = [self._text_index(group).candidates(term) for group in groups]
+            df = self.df
+        if any(rows is None for rows in found):
+            rows = np.flatnonzero(mask)
+        else:
+            rows = np.unique(np.concatenate(found))
+            rows = rows[rows < len(mask)]
+            rows = rows[mask[rows]]
+        subset = df.iloc[rows]
+        hit = np.zeros(len(rows), dtype=bool)
+        for col in columns:
+            hit |= subset[col].str.contains(term, case=False, regex=False, na=False).to_numpy()
+        return rows[hit]
+
+    def _text_index(self, group):
+        # Built on first search, then kept current by update_many() and append()
+        if group not in self._text_indexes:
+            self._text_indexes[group] = TextIndex(self.df, SEARCH_INDEXES[group])
+        return self._text_indexes[group]
+
+    def _assign_ids(self, rows):
+        # Keep incoming IDs that are free; missing or clashing ones get fresh IDs
+        ids = rows["Prospect ID"]
+        clashes = ids.isna() | ids.duplicated() | np.array([pid in self.ids for pid in ids.tolist()], dtype=bool)
+        if len(ids) and ids.notna().any():
+            self.next_id = max(self.next_id, int(ids.max()) + 1)
+        rows.loc[clashes, "Prospect ID"] = np.arange(self.next_id, self.next_id + int(clashes.sum()))
+        self.next_id += int(clashes.sum())
+
+    def cached(self, key, build):
+        # Derived view of the data, rebuilt only after a write bumps the version,
+        # so widget-only reruns reuse every chart and aggregate. The build runs
+        # outside the lock so it never holds up writers; two sessions missing
+        # at once may both build, and the later one's entry is kept.
+        with self.lock:
+            entry = self._views.get(key)
+            if entry is not None and entry[0] == self.version:
+                self._views.move_to_end(key)
+                return entry[1]
+            version, df = self.version, self.df
+        entry = (version, build(df))
+        with self.lock:
+            if version != self.version:
+                # A write landed during the build: serve this result, don't cache it
+                return entry[1]
+            self._views[key] = entry
+            self._views.move_to_end(key)
+            if len(self._views) > VIEW_CACHE_SIZE:
+                stale = [k for k, (version, _) in self._views.items() if version != self.version]
+                for k in stale[:len(self._views) - VIEW_CACHE_SIZE]:
+                    del self._views[k]
+                while len(self._views) > VIEW_CACHE_SIZE:
+                    self._views.popitem(last=False)
+            return entry[1]
+
+    def _shadow_columns(self, column):
+        if column in MONEY_COLUMNS:
+            return [MONEY_COLUMNS[column]]
+        if column == "Budget":
+            return list(BUDGET_COLUMNS)
+        return []
+
+# -------------------- IMPORT PIPELINE --------------------
+# Uploads are read, validated and committed this many rows at a time
+IMPORT_CHUNK_ROWS = 10000
+# Rejected rows kept for the downloadable report; the counts cover all of them
+IMPORT_REJECT_SAMPLE = 1000
+
+# Common vendor headers for schema columns; headers are compared lowercased with punctuation stripped
+IMPORT_ALIASES = {
+    "fullname": "Name", "contactname": "Name",
+    "title": "Title / Role", "jobtitle": "Title / Role", "role": "Title / Role",
+    "companyname": "Company", "organization": "Company", "account": "Company",
+    "emailaddress": "Email", "workemail": "Email",
+    "phonenumber": "Phone", "linkedin": "LinkedIn URL", "linkedinprofile": "LinkedIn URL",
+    "status": "Lead Status", "stage": "Deal Stage", "leadsource": "Source",
+    "painpoints": "Pain Point(s)", "painpoint": "Pain Point(s)", "url": "Website", "employees": "Employee Count",
+}
+
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+
+def _header_key(header):
+    return re.sub(r"[^a-z0-9]", "", str(header).lower())
+
+def map_import_columns(columns):
+    # {upload header: schema column} for the headers we recognise; the first match wins
+    schema = {_header_key(col): col for col in PROSPECT_COLUMNS}
+    mapping = {}
+    for header in columns:
+        key = _header_key(header)
+        target = schema.get(key) or IMPORT_ALIASES.get(key)
+        if target and target not in mapping.values():
+            mapping[header] = target
+    return mapping
+
+def read_import_chunks(uploaded_file, chunksize=IMPORT_CHUNK_ROWS):
+    # Yield the upload as DataFrames of at most chunksize rows, all values as text
+    name = uploaded_file.name.lower()
+    if name.endswith(".csv"):
+        yield from pd.read_csv(uploaded_file, chunksize=chunksize, dtype=str, keep_default_na=False)
+    elif name.endswith((".ndjson", ".jsonl")):
+        yield from pd.read_json(uploaded_file, lines=True, chunksize=chunksize, dtype=False)
+    elif name.endswith(".json"):
+        # A JSON array can't be read incrementally, so it is parsed whole and then chunked
+        data = pd.read_json(uploaded_file, dtype=False)
+        for start in range(0, len(data), chunksize):
+            yield data.iloc[start:start + chunksize]
+    elif name.endswith(".xlsx"):
+        from openpyxl import load_workbook
+        sheet = load_workbook(uploaded_file, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunksize:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    else:
+        raise ValueError(f"Unsupported file type: {uploaded_file.name}")
+
+def preview_import(uploaded_file, rows=5):
+    preview = next(read_import_chunks(uploaded_file, chunksize=rows), pd.DataFrame())
+    uploaded_file.seek(0)
+    return preview
+
+def validate_import_chunk(chunk):
+    # Split a chunk (already renamed to schema columns) into rows to import and
+    # rejected rows with a Reject Reason; every check is a vectorized mask
+    def present(col):
+        if col not in chunk.columns:
+            return pd.Series(False, index=chunk.index)
+        return _blank_to_na(chunk[col]).notna()
+
+    reasons = pd.Series("", index=chunk.index, dtype=object)
+    def reject(mask, reason):
+        reasons[mask & (reasons == "")] = reason
+
+    reject(~present("Name") & ~present("Email"), "Missing name and email")
+    if "Email" in chunk.columns:
+        email = chunk["Email"].astype(str).str.strip()
+        reject(present("Email") & ~email.str.match(EMAIL_PATTERN), "Invalid email")
+    for col in DATE_COLUMNS:
+        if col in chunk.columns:
+            parsed = parse_dates(chunk[col])
+            reject(present(col) & parsed.isna(), f"Unreadable {col}")
+    for col in COUNT_COLUMNS + NULLABLE_INT_COLUMNS:
+        if col in chunk.columns:
+            values = _blank_to_na(chunk[col]).astype(str).str.replace(",", "", regex=False)
+            number = pd.to_numeric(values.where(present(col)), errors="coerce")
+            reject(present(col) & number.isna(), f"Non-numeric {col}")
+            if col == "Lead Score":
+                reject(number.notna() & ((number < 0) | (number > 100)), "Lead Score outside 0-100")
+
+    rejected = reasons != ""
+    return chunk[~rejected], chunk[rejected].assign(**{"Reject Reason": reasons[rejected]})
+
+def _repeated(keys):
+    return (keys.notna() & keys.duplicated()).to_numpy()
+
+def import_prospects(store, chunks, keep_ids=True, policy="keep", progress=None):
+    # Validate and commit an upload chunk by chunk; each chunk is its own transaction.
+    # Rows matching an existing prospect are handled per policy (see DEDUPE_POLICIES)
+    # and repeats within the upload are skipped. progress(rows_read) is called after every chunk.
+    report = {"read": 0, "imported": 0, "rejected": 0, "duplicates": 0, "merged": 0,
+              "reasons": defaultdict(int), "unmapped": []}
+    samples = []
+    mapping = None
+    for chunk in chunks:
+        if mapping is None:
+            mapping = map_import_columns(chunk.columns)
+            report["unmapped"] = [col for col in chunk.columns if col not in mapping]
+        chunk = chunk[list(mapping)].rename(columns=mapping)
+        if not keep_ids:
+            chunk = chunk.drop(columns=["Prospect ID"], errors="ignore")
+        valid, rejected = validate_import_chunk(chunk)
+        existing = store.find_duplicates(valid)
+        repeated = (_repeated(email_keys(valid)) | _repeated(person_keys(valid))) & (existing < 0)
+        fresh = (existing < 0) & ~repeated
+        if fresh.any():
+            store.append(valid[fresh])
+        matched = existing >= 0
+        if policy != "keep" and matched.any():
+            first = ~pd.Series(existing[matched]).duplicated().to_numpy()
+            upload = valid[matched][first]
+            filled = {col: _filled(upload[col]) for col in upload.columns if col in PROSPECT_COLUMNS and col != "Prospect ID"}
+            store.merge(existing[matched][first], normalize_prospects(upload), filled, policy)
+            report["merged"] += int(first.sum())
+        report["read"] += len(chunk)
+        report["imported"] += int(fresh.sum())
+        report["duplicates"] += int(matched.sum() + repeated.sum())
+        report["rejected"] += len(rejected)
+        for reason, count in rejected["Reject Reason"].value_counts().items():
+            report["reasons"][reason] += int(count)
+        kept = sum(len(sample) for sample in samples)
+        if kept < IMPORT_REJECT_SAMPLE and len(rejected):
+            samples.append(rejected.head(IMPORT_REJECT_SAMPLE - kept))
+        if progress:
+            progress(report["read"])
+    report["sample"] = pd.concat(samples) if samples else pd.DataFrame()
+    return report
+
+def import_progress(uploaded_file):
+    # Progress bar driven by how far the reader has got through the upload
+    bar = st.progress(0.0)
+    def update(rows):
+        bar.progress(min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0), text=f"{rows:,} rows read")
+    return update
+
+def show_import_report(report):
+    st.success(f"Imported {report['imported']} of {report['read']} rows.")
+    if report["duplicates"]:
+        st.info(f"{report['duplicates']} rows matched existing prospects or earlier rows; {report['merged']} prospects updated.")
+    if report["unmapped"]:
+        st.info("Ignored columns not in the CRM schema: " + ", ".join(map(str, report["unmapped"])))
+    if report["rejected"]:
+        st.warning(f"Rejected {report['rejected']} rows:")
+        st.write(pd.Series(report["reasons"], name="Rows").rename_axis("Reason"))
+        st.download_button(
+            "📥 Download rejected rows",
+            report["sample"].to_csv(index=False),
+            "rejected_rows.csv",
+            "text/csv"
+        )
 
-    return {
-        "total": total,
-        "contacted": contacted,
-        "meetings": meetings,
-        "proposals": proposals,
-        "negotiations": negotiations,
-        "closed_won": closed_won,
-        "closed_lost": closed_lost,
-        "total_emails_sent": int(total_emails_sent),
-        "total_opened": int(total_opened),
-        "total_replies": int(total_replies),
-        "open_rate": round(open_rate, 1),
-        "reply_rate": round(reply_rate, 1),
-        "contact_to_meeting": round(contact_to_meeting, 1),
-        "meeting_to_proposal": round(meeting_to_proposal, 1),
-        "proposal_to_close": round(proposal_to_close, 1),
-        "avg_deal": round(avg_deal, 2) if not np.isnan(avg_deal) else 0,
-        "total_pipeline": round(total_pipeline, 2) if not np.isnan(total_pipeline) else 0,
-        "avg_lead_score": round(avg_lead_score, 1)
+# -------------------- EXPORT --------------------
+# Exports are converted this many rows at a time
+EXPORT_CHUNK_ROWS = 10000
+# Export files stay in memory up to this size, then spill to a temporary file
+EXPORT_SPOOL_BYTES = 32 * 1024 * 1024
+
+# Format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "JSON": (".json", "application/json"),
+    "NDJSON": (".ndjson", "application/x-ndjson"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+def export_chunks(df, rows=None, chunksize=EXPORT_CHUNK_ROWS):
+    # export_columns() of df (or of the given row positions) one slice at a time
+    # always at least one, possibly empty, chunk so every format still gets its header
+    total = len(df) if rows is None else len(rows)
+    for start in range(0, max(total, 1), chunksize):
+        part = slice(start, start + chunksize) if rows is None else rows[start:start + chunksize]
+        yield export_columns(df.iloc[part])
+
+def write_export(chunks, export_format, out):
+    # Write chunks to the binary file out; only one chunk is converted at a time
+    if export_format == "Parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema, compression="zstd")
+            writer.write_table(table.cast(writer.schema))
+        if writer is not None:
+            writer.close()
+    elif export_format == "Excel":
+        from openpyxl import Workbook
+        book = Workbook(write_only=True)
+        sheet = book.create_sheet("Prospects")
+        for i, chunk in enumerate(chunks):
+            if i == 0:
+                sheet.append(list(chunk.columns))
+            for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+                sheet.append(row)
+        book.save(out)
+    else:
+        text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+        if export_format == "JSON":
+            text.write("[")
+        for i, chunk in enumerate(chunks):
+            if export_format == "CSV":
+                chunk.to_csv(text, index=False, header=i == 0, date_format="%Y-%m-%d")
+                continue
+            records = chunk.to_json(orient="records", lines=True, date_format="iso").strip()
+            if export_format == "JSON":
+                text.write((",\n" if i else "\n") + records.replace("\n", ",\n"))
+            elif records:
+                text.write(records + "\n")
+        if export_format == "JSON":
+            text.write("\n]\n")
+        text.flush()
+        text.detach()
+
+def spool_export(chunks, export_format):
+    # The finished export as a file object positioned at the start
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    write_export(chunks, export_format, out)
+    out.seek(0)
+    return out
+
+def export_download(label, chunks, export_format, file_stem):
+    # Streamlit serves downloads from memory, so only the finished file is read back in
+    extension, mime = EXPORT_FORMATS[export_format]
+    with spool_export(chunks, export_format) as export_file:
+        st.download_button(label, export_file.read(), file_stem + extension, mime)
+
+# -------------------- BACKUPS --------------------
+# Backup files and their manifest live here; set CRM_BACKUP_DIR to move them
+CRM_BACKUP_DIR = os.environ.get("CRM_BACKUP_DIR", "backups")
+
+class BackupChain:
+    # Parquet backups as a chain: a base snapshot of every prospect, then deltas
+    # holding only the rows written since the previous backup (found through the
+    # per-row _version stamp). A reset starts a new base. Restoring a point loads
+    # the latest base at or before it and replays the deltas up to it.
+
+    def __init__(self, directory=CRM_BACKUP_DIR):
+        self.directory = directory
+        self.manifest = os.path.join(directory, "manifest.json")
+
+    def entries(self):
+        if not os.path.exists(self.manifest):
+            return []
+        with open(self.manifest) as f:
+            return json.load(f)
+
+    def create(self, store):
+        # Write the next backup in the chain and return its manifest entry
+        os.makedirs(self.directory, exist_ok=True)
+        entries = self.entries()
+        with store.lock:
+            # The committed version, not store.version: a rolled-back write leaves
+            # the in-memory counter ahead of what is on disk
+            df, version = store.df, store.db.version()
+            last = entries[-1]["version"] if entries else None
+            full = last is None or store.db.get_meta("reset_version", 0) > last
+            rows = None if full else np.sort(store.rows_for(store.db.ids_changed_since(last)))
+        kind = "base" if full else "delta"
+        entry = {
+            "kind": kind,
+            "file": f"{len(entries):05d}_{kind}_v{version}.parquet",
+            "version": version,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "rows": len(df) if rows is None else len(rows),
+        }
+        with open(self.path(entry), "wb") as f:
+            write_export(export_chunks(df, rows), "Parquet", f)
+        entry["bytes"] = os.path.getsize(self.path(entry))
+        with open(self.manifest, "w") as f:
+            json.dump(entries + [entry], f, indent=2)
+        return entry
+
+    def restore(self, position):
+        # Prospects as of manifest entry position, as a normalized frame
+        entries = self.entries()[:position + 1]
+        start = max(i for i, entry in enumerate(entries) if entry["kind"] == "base")
+        frame = None
+        for entry in entries[start:]:
+            rows = pd.read_parquet(self.path(entry))
+            if frame is None:
+                frame = rows
+            else:
+                frame = pd.concat([frame[~frame["Prospect ID"].isin(rows["Prospect ID"])], rows])
+        return normalize_prospects(frame.sort_values("Prospect ID"))
+
+    def path(self, entry):
+        return os.path.join(self.directory, entry["file"])
+
+# -------------------- EMAIL TEMPLATES --------------------
+# Email template library
+EMAIL_TEMPLATES = {
+    "Initial Outreach": {
+        "subject": "Quick question about [Company Name]'s [pain point]",
+        "body": """Hi [First Name],
+
+I noticed [Company Name] is [relevant observation about their business]. 
+
+Many companies in [industry] are facing similar challenges with [specific pain point]. We've helped businesses like yours [specific benefit/result].
+
+Would you be open to a brief conversation about how we could help [Company Name] achieve similar results?
+
+Best regards,
+[Your Name]
+[Your Title]
+[Company]"""
+    },
+    "Follow-up": {
+        "subject": "Following up on [Company Name] + [Your Company]",
+        "body": """Hi [First Name],
+
+I wanted to follow up on my previous email about helping [Company Name] with [pain point].
+
+I came across this case study of how [similar company] achieved [specific result] using our solution: [link or brief description]
+
+Would you like to see how this could apply to [Company Name]?
+
+Best,
+[Your Name]"""
+    },
+    "Value Proposition": {
+        "subject": "How [Competitor/Similar Company] reduced costs by 30%",
+        "body": """Hi [First Name],
+
+I thought you'd find this interesting:
+
+[Similar Company] recently implemented our AI solution and saw:
+• 30% reduction in operational costs
+• 50% faster processing times  
+• 90% accuracy improvement
+
+Given [Company Name]'s focus on [relevant area], I believe we could deliver similar results for you.
+
+Would you like a 15-minute call to explore this?
+
+Best regards,
+[Your Name]"""
+    },
+    "Final Attempt": {
+        "subject": "Should I close your file?",
+        "body": """Hi [First Name],
+
+I've reached out a few times about helping [Company Name] with [pain point], but haven't heard back.
+
+Should I assume this isn't a priority right now and close your file?
+
+If the timing isn't right, just let me know when might be better to reconnect.
+
+Best,
+[Your Name]"""
     }
+}
+
+# Template placeholders (matched case-insensitively) and the prospect column
+# each is filled from; any other placeholder is left as written
+TEMPLATE_FIELDS = {
+    "first name": "Name",
+    "company name": "Company",
+    "industry": "Industry",
+    "pain point": "Pain Point(s)",
+    "specific pain point": "Pain Point(s)",
+}
+# Placeholders switched on by each campaign personalization option; first
+# names are always filled
+PERSONALIZE_OPTIONS = {
+    "Auto-personalize company name": ["company name"],
+    "Auto-personalize industry": ["industry"],
+    "Include pain points": ["pain point", "specific pain point"],
+}
+PLACEHOLDER_PATTERN = re.compile(r"\[([^\[\]]+)\]")
+
+@functools.lru_cache(maxsize=128)
+def compile_template(text):
+    # Render plan for text, parsed once per distinct text: the literal pieces
+    # around the placeholders, and each placeholder's field (None if unmapped)
+    pieces = PLACEHOLDER_PATTERN.split(text)
+    literals = tuple(pieces[0::2])
+    fields = tuple(name.strip().lower() if name.strip().lower() in TEMPLATE_FIELDS else None for name in pieces[1::2])
+    return literals, tuple(pieces[1::2]), fields
+
+def template_values(df, field):
+    values = df[TEMPLATE_FIELDS[field]].astype("string").str.strip()
+    if field == "first name":
+        values = values.str.split(" ", n=1).str[0]
+    return values.mask(values == "")
+
+def render_template(text, df, fields=None):
+    # text rendered for every row of df, one vectorized concatenation per piece.
+    # fields limits which mapped placeholders are filled (default all). Returns
+    # the rendered strings and a boolean frame of the placeholders each row had
+    # no value for; those render empty
+    literals, names, mapped = compile_template(text)
+    rendered = pd.Series(literals[0], index=df.index, dtype="string")
+    missing = {}
+    for literal, name, field in zip(literals[1:], names, mapped):
+        if field is None or (fields is not None and field not in fields):
+            rendered = rendered + f"[{name}]" + literal
+            continue
+        values = template_values(df, field)
+        missing[name] = values.isna()
+        rendered = rendered + values.fillna("") + literal
+    return rendered, pd.DataFrame(missing, index=df.index)
+
+def template_missing(text, df, fields=None):
+    # render_template()'s missing-field frame alone, without rendering the text
+    _, names, mapped = compile_template(text)
+    return pd.DataFrame({
+        name: template_values(df, field).isna()
+        for name, field in zip(names, mapped)
+        if field is not None and (fields is None or field in fields)
+    }, index=df.index)
+
+def unfilled_placeholders(text, fields=None):
+    # Placeholders of text that are sent as written, the same for every row:
+    # those with no prospect column, and mapped ones switched off by fields
+    _, names, mapped = compile_template(text)
+    return list(dict.fromkeys(
+        f"[{name}]" for name, field in zip(names, mapped)
+        if field is None or (fields is not None and field not in fields)
+    ))
+
+def missing_fields(missing):
+    # Comma-separated missing placeholders per row of a missing-field frame;
+    # a placeholder used twice has the same column twice
+    missing = missing.loc[:, ~missing.columns.duplicated()]
+    if missing.empty:
+        return pd.Series("", index=missing.index)
+    return missing.dot(missing.columns + ", ").str.rstrip(", ")
+
+# -------------------- EMAIL SENDER --------------------
+# SMTP relay; campaigns are only recorded, not sent, until CRM_SMTP_HOST is set.
+# Point it at a local debugging server to exercise the sender without real mail
+SMTP_HOST = os.environ.get("CRM_SMTP_HOST", "")
+SMTP_PORT = int(os.environ.get("CRM_SMTP_PORT", "25"))
+SMTP_USER = os.environ.get("CRM_SMTP_USER", "")
+SMTP_PASSWORD = os.environ.get("CRM_SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.environ.get("CRM_SMTP_STARTTLS", "0") == "1"
+SMTP_SENDER = os.environ.get("CRM_SMTP_FROM", "sales@localhost")
+SMTP_TIMEOUT = 30
+# Persistent connections, each driven by one send worker
+SMTP_CONNECTIONS = int(os.environ.get("CRM_SMTP_CONNECTIONS", "8"))
+# Messages per second overall and to any one recipient domain
+SMTP_RATE = float(os.environ.get("CRM_SMTP_RATE", "50"))
+SMTP_DOMAIN_RATE = float(os.environ.get("CRM_SMTP_DOMAIN_RATE", "5"))
+# Transient failures (4xx replies, dropped connections) are retried this many
+# times, waiting SMTP_BACKOFF seconds and doubling each time
+SMTP_RETRIES = int(os.environ.get("CRM_SMTP_RETRIES", "3"))
+SMTP_BACKOFF = float(os.environ.get("CRM_SMTP_BACKOFF", "1"))
+
+class TokenBucket:
+    # Allows rate events per second on average, in bursts of up to burst
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+
+    async def take(self):
+        # No await between the refill and the decrement, so tasks on one loop can share a bucket
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class SMTPPool:
+    # Up to size logged-in connections, reused across messages. smtplib blocks,
+    # so each call runs in a thread; a connection that drops is closed and the
+    # next send opens a fresh one
+    def __init__(self, size):
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+
+    async def send(self, message):
+        async with self.slots:
+            conn = self.idle.pop() if self.idle else await asyncio.to_thread(self._connect)
+            try:
+                await asyncio.to_thread(conn.send_message, message)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # The server refused this message; smtplib has reset the session
+                self.idle.append(conn)
+                raise
+            except OSError:
+                await asyncio.to_thread(self._close, conn)
+                raise
+            self.idle.append(conn)
+
+    async def close(self):
+        while self.idle:
+            await asyncio.to_thread(self._close, self.idle.pop())
+
+    @staticmethod
+    def _connect():
+        conn = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            conn.starttls()
+        if SMTP_USER:
+            conn.login(SMTP_USER, SMTP_PASSWORD)
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.quit()
+        except OSError:
+            conn.close()
+
+def _transient(error):
+    # 4xx replies and connection trouble are worth retrying; 5xx replies are final
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return True
+
+async def deliver(messages, on_result, on_send=None):
+    # Send (key, message) pairs with SMTP_CONNECTIONS workers pulling from
+    # one iterator, under the global and per-domain rate limits; calls
+    # on_send(key) just before a message first goes to the relay and
+    # on_result(key, status) once it is settled
+    pool = SMTPPool(SMTP_CONNECTIONS)
+    overall = TokenBucket(SMTP_RATE)
+    domains = defaultdict(lambda: TokenBucket(SMTP_DOMAIN_RATE))
+    pending = iter(messages)
+
+    async def worker():
+        for key, message in pending:
+            domain = message["To"].rpartition("@")[2].lower()
+            for attempt in range(SMTP_RETRIES + 1):
+                await domains[domain].take()
+                await overall.take()
+                if on_send and attempt == 0:
+                    on_send(key)
+                try:
+                    await pool.send(message)
+                    on_result(key, "Sent")
+                    break
+                except OSError as error:
+                    if attempt == SMTP_RETRIES or not _transient(error):
+                        on_result(key, EMAIL_SEND_FAILED)
+                        break
+                    await asyncio.sleep(SMTP_BACKOFF * 2 ** attempt)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(SMTP_CONNECTIONS)))
+    finally:
+        await pool.close()
+
+def compose_email(to, subject, body):
+    # MIMEText builds about twenty times faster than EmailMessage, which shows at campaign volume
+    message = MIMEText(body, "plain", "utf-8")
+    message["From"] = SMTP_SENDER
+    message["To"] = to
+    # Header values must stay on one line; only non-ASCII ones need encoding
+    subject = " ".join(subject.split())
+    message["Subject"] = subject if subject.isascii() else Header(subject, "utf-8")
+    return message
+
+def campaign_messages(df, rows, template, fields=None):
+    # (row, message) for each target; the text is rendered for all of them
+    # at once, the messages built as the workers ask for them
+    targets = df.loc[rows]
+    subjects, _ = render_template(template["subject"], targets, fields)
+    bodies, _ = render_template(template["body"], targets, fields)
+    for row, email, subject, body in zip(targets.index, targets["Email"], subjects, bodies):
+        yield row, compose_email(email, subject, body)
+
+# -------------------- CAMPAIGN QUEUE --------------------
+# Jobs the worker claims per round trip; outcomes are checkpointed as often
+CAMPAIGN_CLAIM_ROWS = 50
+# Seconds the idle worker waits before looking for due jobs again
+CAMPAIGN_POLL_SECONDS = 2
+# Failed campaign worker rounds are logged here and retried
+logger = logging.getLogger(__name__)
+# How often the Send Campaigns progress refreshes while jobs are pending
+CAMPAIGN_REFRESH_SECONDS = 1
+JOB_STATES = ["queued", "claimed", "sending", "sent", "failed", "skipped", "unknown"]
+# States of jobs not finished yet
+JOB_PENDING = ("queued", "claimed", "sending")
+# Job state recorded for each send outcome
+JOB_OUTCOMES = {"Sent": "sent", EMAIL_SEND_FAILED: "failed"}
+
+class CampaignQueue:
+    # Durable campaign jobs, stored next to the prospects. A job is one
+    # prospect's email in one campaign, in a reserved Email N slot. The worker
+    # claims jobs a batch at a time, marks each one sending just before its
+    # email goes out and settles it after. On recovery, claimed jobs go back to
+    # the queue; a job still sending may already have been delivered, so it is
+    # marked unknown instead of being sent again.
+
+    def __init__(self, path=CRM_DB_PATH):
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.Lock()
+        with self.batch():
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS campaigns (id INTEGER PRIMARY KEY, name TEXT, subject TEXT, "
+                "body TEXT, fields TEXT, send_date TEXT, created TEXT)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS campaign_jobs (id INTEGER PRIMARY KEY, campaign INTEGER, "
+                "prospect_id INTEGER, slot INTEGER, scheduled TEXT, state TEXT, updated TEXT)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON campaign_jobs (state, scheduled)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_campaign ON campaign_jobs (campaign, state)")
+
+    @contextmanager
+    def batch(self):
+        # One transaction, one thread at a time
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def enqueue(self, name, template, fields, send_date, scheduled, prospect_ids, slots):
+        # New campaign with one job per prospect; slot 3 (none free) is recorded as skipped
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.batch():
+            campaign = self.conn.execute(
+                "INSERT INTO campaigns (name, subject, body, fields, send_date, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, template["subject"], template["body"], json.dumps(sorted(fields)), pd.Timestamp(send_date).isoformat(), now)
+            ).lastrowid
+            self.conn.executemany(
+                "INSERT INTO campaign_jobs (campaign, prospect_id, slot, scheduled, state, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (campaign, int(pid), int(slot), scheduled.isoformat(timespec="seconds"),
+                     "queued" if slot < len(EMAIL_DATE_COLUMNS) else "skipped", now)
+                    for pid, slot in zip(prospect_ids, slots)
+                ]
+            )
+        return campaign
+
+    def reserved(self):
+        # (prospect ID, slot) of every job still waiting to be sent
+        with self.lock:
+            return self.conn.execute(
+                "SELECT prospect_id, slot FROM campaign_jobs WHERE state IN ('queued', 'claimed', 'sending')"
+            ).fetchall()
+
+    def claim(self, limit):
+        # Up to limit due jobs, oldest first, moved to claimed in one transaction
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.batch():
+            jobs = pd.read_sql_query(
+                "SELECT id, campaign, prospect_id, slot FROM campaign_jobs "
+                "WHERE state = 'queued' AND scheduled <= ? ORDER BY scheduled, id LIMIT ?",
+                self.conn, params=(now, limit)
+            )
+            self.conn.executemany(
+                "UPDATE campaign_jobs SET state = 'claimed', updated = ? WHERE id = ?",
+                [(now, job_id) for job_id in jobs["id"].tolist()]
+            )
+        return jobs
+
+    def sending(self, job_id):
+        # Committed before the email goes out, so a crash from here on leaves it unknown
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.batch():
+            self.conn.execute("UPDATE campaign_jobs SET state = 'sending', updated = ? WHERE id = ?", (now, int(job_id)))
+
+    def settle(self, job_ids, states):
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.batch():
+            self.conn.executemany(
+                "UPDATE campaign_jobs SET state = ?, updated = ? WHERE id = ?",
+                [(state, now, int(job_id)) for job_id, state in zip(job_ids, states)]
+            )
+
+    def recover(self):
+        # Called when no send is in flight. Claimed jobs never reached the relay
+        # and are queued again; a job left sending was interrupted after its
+        # email may have gone out. Returns the number of unknown jobs
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.batch():
+            self.conn.execute("UPDATE campaign_jobs SET state = 'queued', updated = ? WHERE state = 'claimed'", (now,))
+            return self.conn.execute(
+                "UPDATE campaign_jobs SET state = 'unknown', updated = ? WHERE state = 'sending'", (now,)
+            ).rowcount
+
+    def campaign(self, campaign_id):
+        with self.lock:
+            name, subject, body, fields, send_date = self.conn.execute(
+                "SELECT name, subject, body, fields, send_date FROM campaigns WHERE id = ?", (campaign_id,)
+            ).fetchone()
+        return {
+            "name": name, "template": {"subject": subject, "body": body},
+            "fields": set(json.loads(fields)), "send_date": pd.Timestamp(send_date),
+        }
+
+    def has_due(self):
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM campaign_jobs WHERE state = 'queued' AND scheduled <= ? LIMIT 1", (now,)
+            ).fetchone() is not None
+
+    def pending(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM campaign_jobs WHERE state IN ('queued', 'claimed', 'sending') LIMIT 1"
+            ).fetchone() is not None
+
+    def progress(self):
+        # Job counts by state for each campaign, newest campaign first
+        with self.lock:
+            counts = pd.read_sql_query(
+                "SELECT c.id, c.name, c.created, j.state, COUNT(*) AS jobs FROM campaign_jobs j "
+                "JOIN campaigns c ON c.id = j.campaign GROUP BY c.id, j.state",
+                self.conn
+            )
+        if counts.empty:
+            return pd.DataFrame(columns=["id", "name", "created"] + JOB_STATES + ["total"])
+        table = counts.pivot_table(index=["id", "name", "created"], columns="state", values="jobs", fill_value=0)
+        table = table.reindex(columns=JOB_STATES, fill_value=0).astype(int)
+        table["total"] = table.sum(axis=1)
+        return table.reset_index().sort_values("id", ascending=False)
+
+class CampaignWorker:
+    # Background thread draining the queue, one per server process. While due
+    # jobs remain, one deliver() run keeps its SMTP connections open and pulls
+    # messages a claim at a time; every CAMPAIGN_CLAIM_ROWS outcomes are
+    # written to the prospects and then settled in the queue
+    def __init__(self, store, queue):
+        self.store = store
+        self.queue = queue
+        self.results = []
+        self.settled = deque()
+        self.campaigns = {}
+        self.wake = threading.Event()
+        self.queue.recover()
+        threading.Thread(target=self._run, name="campaign-worker", daemon=True).start()
+
+    def _run(self):
+        # Nothing may end this loop: the worker is cached for the life of the
+        # process, so a dead thread would leave every later campaign queued.
+        # After a failed round the held outcomes are checkpointed first and only
+        # then are leftover jobs recovered, so none that has an outcome waiting
+        # is marked unknown; until both succeed nothing new is claimed
+        stalled = False
+        while True:
+            try:
+                self._checkpoint()
+                if stalled:
+                    self.queue.recover()
+                    stalled = False
+                if self.queue.has_due():
+                    asyncio.run(deliver(self._messages(), self._on_result, self._on_send))
+                    self._checkpoint()
+                    continue
+            except Exception:
+                logger.exception("Campaign worker round failed; retrying")
+                stalled = True
+            self.wake.wait(CAMPAIGN_POLL_SECONDS)
+            self.wake.clear()
+
+    def _messages(self):
+        while True:
+            jobs = self.queue.claim(CAMPAIGN_CLAIM_ROWS)
+            if jobs.empty:
+                return
+            yield from self._job_messages(jobs)
+
+    def _job_messages(self, jobs):
+        # ((job, row, slot, campaign), message) per job; jobs whose prospect is
+        # gone or has no address settle here without a message
+        df = self.store.df
+        jobs["row"] = jobs["prospect_id"].map(self.store.ids)
+        for campaign_id, group in jobs.groupby("campaign"):
+            if campaign_id not in self.campaigns:
+                self.campaigns[campaign_id] = self.queue.campaign(campaign_id)
+            campaign = self.campaigns[campaign_id]
+            present = group[group["row"].notna()]
+            for job_id in group.loc[group["row"].isna(), "id"].tolist():
+                self._on_result((job_id, None, None, campaign_id), "skipped")
+            rows = present["row"].astype(np.int64).to_numpy()
+            has_email = df.loc[rows, "Email"].str.contains("@", regex=False, na=False).tolist()
+            keys = list(zip(present["id"].tolist(), rows.tolist(), present["slot"].tolist(), [campaign_id] * len(rows)))
+            sendable = []
+            for key, ok in zip(keys, has_email):
+                if ok:
+                    sendable.append(key)
+                else:
+                    self._on_result(key, EMAIL_SEND_FAILED)
+            messages = campaign_messages(df, [key[1] for key in sendable], campaign["template"], campaign["fields"])
+            for key, (_, message) in zip(sendable, messages):
+                yield key, message
+
+    def _on_send(self, key):
+        self.queue.sending(key[0])
+
+    def _on_result(self, key, status):
+        # A failed checkpoint must not abort deliver() with sends in flight;
+        # the outcomes are kept and retried with the next batch
+        self.results.append((key, status))
+        if len(self.results) % CAMPAIGN_CLAIM_ROWS == 0:
+            try:
+                self._checkpoint()
+            except Exception:
+                logger.exception("Campaign checkpoint failed; retrying with the next batch")
+
+    def _checkpoint(self):
+        # Record outcomes on the prospects first, then settle their jobs: a crash
+        # in between leaves the jobs sending, so they are never sent twice.
+        # Results stay pending until settled, so a failed checkpoint is retried
+        results = list(self.results)
+        if not results:
+            return
+        recorded = [(key, status) for key, status in results if key[1] is not None]
+        by_campaign = defaultdict(list)
+        for key, status in recorded:
+            by_campaign[key[3]].append((key[1], key[2], status))
+        for campaign_id, sends in by_campaign.items():
+            rows, slots, statuses = zip(*sends)
+            self.store.record_sends(rows, slots, self.campaigns[campaign_id]["send_date"], list(statuses))
+        self.queue.settle(
+            [key[0] for key, _ in results],
+            [JOB_OUTCOMES.get(status, status) for _, status in results]
+        )
+        del self.results[:len(results)]
+        self.settled.append((time.monotonic(), len(results)))
+
+    def rate(self):
+        # Jobs settled per minute over the last minute
+        cutoff = time.monotonic() - 60
+        while self.settled and self.settled[0][0] < cutoff:
+            self.settled.popleft()
+        return sum(count for _, count in self.settled)
+
+def queue_campaign(store, queue, name, rows, template, fields, send_date, scheduled):
+    # Reserve a free Email N slot per target, skipping slots already held by
+    # queued jobs, and queue one job each; returns the campaign ID
+    ids = store.df.loc[rows, "Prospect ID"].to_numpy()
+    position = {pid: i for i, pid in enumerate(ids.tolist())}
+    reserved = np.zeros((len(ids), len(EMAIL_DATE_COLUMNS)), dtype=bool)
+    for pid, slot in queue.reserved():
+        if pid in position:
+            reserved[position[pid], slot] = True
+    slots = store.free_slots(rows, reserved)
+    return queue.enqueue(name, template, fields, send_date, scheduled, ids, slots)
+
+@st.cache_resource
+def get_store():
+    # One store per server process, shared by all sessions; sessions keep only UI state
+    db = ProspectDB()
+    if db.count() == 0:
+        db.insert(normalize_prospects(load_demo_data()), version=1)
+    return ProspectStore(db)
+
+store = get_store()
+
+@st.cache_resource
+def get_campaign_queue():
+    return CampaignQueue()
+
+@st.cache_resource
+def get_campaign_worker():
+    return CampaignWorker(get_store(), get_campaign_queue())
+
+campaign_queue = get_campaign_queue()
+# Without a relay, queued jobs wait; with one, the worker resumes them at startup
+if SMTP_HOST:
+    get_campaign_worker()
+df = store.df
+
+# -------------------- HELPER FUNCTIONS --------------------
+
+def compute_advanced_metrics(df):
+    # Full-scan metrics; the sidebar reads the store's running counters instead
+    return MetricsEngine(df).snapshot()
+
+# Columns the sidebar quick stats are computed from
+QUICK_STATS_COLUMNS = {"Deal Stage", "Deal Value"}
+
+def rerun_after_write(columns=None):
+    # A write to columns the sidebar doesn't show re-renders only the fragment it
+    # was made in; appends, resets (columns=None) and the rest rerun the whole app
+    if columns is not None and not QUICK_STATS_COLUMNS.intersection(columns):
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            # Raised during a full-app run, where there is no fragment to rerun alone
+            pass
+    st.rerun()
 
 def get_color_for_status(status):
     colors = {
@@ -384,16 +2368,7 @@ def create_lead_score_distribution(df):
     return fig
 
 def create_revenue_by_industry(df):
-    def parse_value(x):
-        try:
-            return float(str(x).replace("$", "").replace(",", "").replace("K", "000").replace("M", "000000"))
-        except:
-            return 0
-    
-    df_temp = df.copy()
-    df_temp["Deal Value Numeric"] = df_temp["Deal Value"].apply(parse_value)
-    
-    industry_revenue = df_temp.groupby("Industry")["Deal Value Numeric"].sum().reset_index()
+    industry_revenue = df.groupby("Industry", observed=True)["Deal Value Numeric"].sum().reset_index()
     
     fig = px.bar(
         industry_revenue,
@@ -405,6 +2380,333 @@ def create_revenue_by_industry(df):
     fig.update_layout(height=400)
     return fig
 
+def build_email_performance(df):
+    # One row per sent email across the three slots
+    email_performance = []
+    for i, (date_col, status_col) in enumerate(zip(EMAIL_DATE_COLUMNS, EMAIL_STATUS_COLUMNS), 1):
+        sent = df[df[date_col].notna() & df[status_col].notna()]
+        email_performance.append(pd.DataFrame({
+            "Email": f"Email {i}",
+            "Date": sent[date_col].dt.date,
+            "Status": sent[status_col].astype(str),
+            "Prospect": sent["Name"],
+            "Industry": sent["Industry"].astype(str)
+        }))
+    return pd.concat(email_performance, ignore_index=True)
+
+def create_email_performance_charts(perf_df):
+    status_counts = perf_df["Status"].value_counts()
+    status_fig = px.pie(values=status_counts.values, names=status_counts.index, title="Email Status Distribution")
+    
+    industry_performance = perf_df.groupby("Industry")["Status"].apply(lambda x: (x == "Opened").sum()).reset_index()
+    industry_performance.columns = ["Industry", "Opens"]
+    industry_fig = px.bar(industry_performance, x="Industry", y="Opens", title="Opens by Industry")
+    return status_fig, industry_fig
+
+def create_industry_funnel(df):
+    industry_funnel = df.groupby("Industry", observed=True).agg({
+        "Lead Status": lambda x: (x != "New").sum(),
+        "Deal Stage": lambda x: (x == "Meeting Scheduled").sum()
+    }).reset_index()
+    industry_funnel.columns = ["Industry", "Contacted", "Meetings"]
+    
+    return px.bar(
+        industry_funnel, 
+        x="Industry", 
+        y=["Contacted", "Meetings"],
+        title="Funnel Performance by Industry",
+        barmode="group"
+    )
+
+def create_source_funnel(df):
+    source_funnel = df.groupby("Source", observed=True).agg({
+        "Lead Status": lambda x: (x != "New").sum(),
+        "Deal Stage": lambda x: (x.isin(["Meeting Scheduled", "Proposal Sent"])).sum()
+    }).reset_index()
+    source_funnel.columns = ["Source", "Contacted", "Advanced"]
+    
+    return px.bar(
+        source_funnel,
+        x="Source",
+        y=["Contacted", "Advanced"],
+        title="Performance by Lead Source",
+        barmode="group"
+    )
+
+def create_weekly_trend(weekly_counts):
+    weekly_adds = weekly_counts.reset_index()
+    weekly_adds.columns = ["Week", "New Prospects"]
+    weekly_adds["Week"] = weekly_adds["Week"].astype(str)
+    
+    return px.line(
+        weekly_adds,
+        x="Week",
+        y="New Prospects",
+        title="Weekly Prospect Addition Trend",
+        markers=True
+    )
+
+def create_email_timeline(df):
+    email_dates = pd.concat([df[col] for col in EMAIL_DATE_COLUMNS]).dropna()
+    if email_dates.empty:
+        return None
+    
+    email_series = email_dates.dt.date.value_counts().sort_index()
+    return px.line(
+        x=email_series.index,
+        y=email_series.values,
+        title="Email Activity Timeline",
+        markers=True
+    )
+
+def create_score_by_status(df):
+    return px.box(
+        df,
+        x="Lead Status",
+        y="Lead Score",
+        title="Lead Score Distribution by Status"
+    )
+
+def create_score_vs_engagement(df):
+    corr_df = pd.DataFrame({
+        "Lead Score": df["Lead Score"].astype(float),
+        "Email Engagement": df["Opened Emails"] + (df["Replies"] * 2),
+        "Company": df["Company"]
+    }).dropna(subset=["Lead Score"])
+    if corr_df.empty:
+        return None
+    
+    return px.scatter(
+        corr_df,
+        x="Lead Score",
+        y="Email Engagement",
+        hover_data=["Company"],
+        title="Lead Score vs Email Engagement",
+        trendline="ols"
+    )
+
+def create_deal_size_by_company_size(df):
+    size_revenue = df.groupby("Company Size", observed=True)["Deal Value Numeric"].mean().reset_index()
+    
+    return px.bar(
+        size_revenue,
+        x="Company Size",
+        y="Deal Value Numeric",
+        title="Average Deal Size by Company Size",
+        color_discrete_sequence=["#FF6B35"]
+    )
+
+# Probability of closing at each deal stage, for the weighted forecast
+STAGE_WEIGHTS = {
+    "Prospecting": 0.1,
+    "Meeting Scheduled": 0.2,
+    "Proposal Sent": 0.5,
+    "Negotiation": 0.8,
+    "Closed Won": 1.0
+}
+
+def build_revenue_forecast(df):
+    # Conservative: high probability deals; optimistic: all active deals
+    high_prob_deals = df[df["Deal Stage"].isin(["Negotiation", "Proposal Sent"])]
+    active_deals = df[df["Deal Stage"] != "Prospecting"]
+    weights = df["Deal Stage"].astype(object).map(STAGE_WEIGHTS).fillna(0).astype(float)
+    return {
+        "conservative": high_prob_deals["Deal Value Numeric"].sum() * 0.7,
+        "optimistic": active_deals["Deal Value Numeric"].sum(),
+        "weighted": (df["Deal Value Numeric"].fillna(0) * weights).sum(),
+    }
+
+# Grid sort orders: the column that keys each one and whether it runs descending
+GRID_SORT_KEYS = {
+    "Lead Score": ("Lead Score", True),
+    "Date Added": ("Date Added", True),
+    "Name": ("Name", False),
+    "Company": ("Company", False),
+    "Deal Value": ("Deal Value Numeric", False),
+}
+GRID_PAGE_SIZES = [25, 50, 100, 250]
+PRIORITY_COLORS = {"High": "background-color: #ffebee", "Medium": "background-color: #fff3e0"}
+DEFAULT_PRIORITY_COLOR = "background-color: #e8f5e8"
+
+def build_sort_order(df, sort_by):
+    # Row positions of the whole frame in sort order, blanks last; cached per data
+    # version so a filtered grid is ordered by one pass over this permutation
+    column, descending = GRID_SORT_KEYS[sort_by]
+    keys = df[column].reset_index(drop=True)
+    return keys.sort_values(ascending=not descending, kind="stable", na_position="last").index.to_numpy()
+
+def sorted_rows(order, rows, size):
+    # The given row positions (or boolean mask) rearranged into a cached sort order
+    if rows.dtype != bool:
+        mask = np.zeros(size, dtype=bool)
+        mask[rows] = True
+        rows = mask
+    return order[rows[order]]
+
+def highlight_priority(page):
+    # Row colours for the visible page only, looked up per column rather than per row
+    if "Priority" not in page.columns:
+        return page
+    colors = page["Priority"].astype(object).map(PRIORITY_COLORS).fillna(DEFAULT_PRIORITY_COLOR).to_numpy()
+    styles = pd.DataFrame(np.repeat(colors[:, None], page.shape[1], axis=1), index=page.index, columns=page.columns)
+    return page.style.apply(lambda _: styles, axis=None)
+
+def page_slice(total, key, default_size=1):
+    # Rows-per-page and page pickers for a list of total rows; returns the slice
+    # of the chosen page, so a long list never renders more than one page
+    col1, col2, col3 = st.columns([1, 1, 2])
+    page_size = col1.selectbox("Rows per page", GRID_PAGE_SIZES, index=default_size, key=f"{key}_page_size")
+    pages = max(1, -(-total // page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = col2.number_input("Page", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    start = (page - 1) * page_size
+    col3.caption(f"Rows {min(start + 1, total)}-{min(start + page_size, total)} of {total}")
+    return slice(start, start + page_size)
+
+def show_prospect_grid(df, rows, columns, key, height=400, styled=False):
+    # Page through df at the given row positions, sending only the visible page
+    # to the browser; returns the row positions on that page
+    page_rows = rows[page_slice(len(rows), key)]
+    page_df = df.iloc[page_rows][columns]
+    st.dataframe(
+        highlight_priority(page_df) if styled else page_df,
+        use_container_width=True,
+        height=height
+    )
+    return page_rows
+
+def select_rows(table, key, check_label, submit_label):
+    # The table as one editor whose only editable column is a checkbox, inside a
+    # form so ticking rows costs no rerun; returns the positions ticked when the
+    # form is submitted, else an empty array
+    editor_key = f"{key}_editor"
+    with st.form(key):
+        edited = st.data_editor(
+            table.assign(**{check_label: False})[[check_label] + table.columns.tolist()],
+            disabled=table.columns.tolist(),
+            hide_index=True,
+            use_container_width=True,
+            key=editor_key
+        )
+        submitted = st.form_submit_button(submit_label)
+    if not submitted:
+        return np.array([], dtype=int)
+    # The ticks belong to this page of rows; don't carry them over to the next render
+    st.session_state.pop(editor_key, None)
+    return np.flatnonzero(edited[check_label].to_numpy(dtype=bool))
+
+# Date columns shown on the sales calendar, with their event type and status column
+CALENDAR_EVENT_COLUMNS = {
+    "Email 1 Date": ("Email 1", "Email 1 Status"),
+    "Email 2 Date": ("Email 2", "Email 2 Status"),
+    "Email 3 Date": ("Email 3", "Email 3 Status"),
+    "Call / Demo Date": ("Call/Demo", None),
+    "Next Follow Up": ("Follow-up", None),
+}
+
+def build_calendar_events(df):
+    # One row per dated activity, sorted by date so ranges resolve by binary search
+    events = df.melt(
+        id_vars=["Name", "Company", "Priority", "Owner"] + EMAIL_STATUS_COLUMNS,
+        value_vars=list(CALENDAR_EVENT_COLUMNS),
+        var_name="Source",
+        value_name="Date"
+    ).dropna(subset=["Date"])
+
+    source = events["Source"].to_numpy()
+    status = np.full(len(events), "Scheduled", dtype=object)
+    for date_col, (_, status_col) in CALENDAR_EVENT_COLUMNS.items():
+        if status_col:
+            is_source = source == date_col
+            status[is_source] = events[status_col].astype(object).fillna("").to_numpy()[is_source]
+
+    events = pd.DataFrame({
+        "Date": events["Date"],
+        "Type": events["Source"].map({col: spec[0] for col, spec in CALENDAR_EVENT_COLUMNS.items()}),
+        "Prospect": events["Name"],
+        "Company": events["Company"],
+        "Status": status,
+        "Priority": events["Priority"],
+        "Owner": events["Owner"]
+    })
+    return events.sort_values("Date", kind="stable").reset_index(drop=True)
+
+TASK_PRIORITY_ORDER = {"High": 3, "Medium": 2, "Low": 1}
+
+TASK_SOURCE_COLUMNS = ["Prospect ID", "Name", "Company", "Priority"]
+
+def _task_frame(rows, task, due_date, priority, task_type, status, anchor):
+    if isinstance(priority, str):
+        priority_score = TASK_PRIORITY_ORDER[priority]
+    else:
+        priority_score = priority.map(TASK_PRIORITY_ORDER).astype(float).fillna(0).to_numpy()
+        priority = priority.astype(object)
+    return pd.DataFrame({
+        "Task": task + rows["Name"],
+        "Prospect": rows["Name"],
+        "Company": rows["Company"],
+        "Due Date": due_date,
+        "Priority": priority,
+        "Type": task_type,
+        "Status": status,
+        "Prospect ID": rows["Prospect ID"],
+        "Anchor Date": anchor,
+        "Priority Score": priority_score
+    })
+
+def build_tasks(df, today):
+    # Derive the task list with one mask per task class, sorted by priority then due date.
+    # Each task is anchored on the date that created it, so a completed task only
+    # comes back once that date changes (e.g. a new follow-up is scheduled).
+    today = pd.Timestamp(today)
+
+    # Overdue follow-ups
+    follow_up = df["Next Follow Up"] <= today
+    rows = df.loc[follow_up, TASK_SOURCE_COLUMNS + ["Next Follow Up"]]
+    follow_ups = _task_frame(
+        rows, "Follow up with ", rows["Next Follow Up"], rows["Priority"], "Follow-up",
+        np.where(rows["Next Follow Up"] < today, "Overdue", "Due Today"), rows["Next Follow Up"]
+    )
+
+    # Proposals requiring follow-up
+    stale = (df["Deal Stage"] == "Proposal Sent") & (df["Last Contact"] <= today - pd.Timedelta(days=7))
+    rows = df.loc[stale, TASK_SOURCE_COLUMNS + ["Last Contact"]]
+    proposals = _task_frame(
+        rows, "Follow up on proposal with ", today, "High", "Proposal Follow-up", "Overdue", rows["Last Contact"]
+    )
+
+    # New prospects requiring initial contact
+    uncontacted = (df["Lead Status"] == "New") & (df["Date Added"] <= today - pd.Timedelta(days=1))
+    rows = df.loc[uncontacted, TASK_SOURCE_COLUMNS + ["Date Added"]]
+    new_leads = _task_frame(
+        rows, "Initial outreach to ", today, rows["Priority"], "Initial Contact", "Pending", rows["Date Added"]
+    )
+
+    tasks = pd.concat([follow_ups, proposals, new_leads], ignore_index=True)
+    order = np.lexsort((tasks["Due Date"].to_numpy(), -tasks["Priority Score"].to_numpy()))
+    return tasks.take(order).reset_index(drop=True)
+
+def task_keys(tasks):
+    return pd.MultiIndex.from_arrays([tasks["Prospect ID"], tasks["Type"], tasks["Anchor Date"]])
+
+PRIORITY_ICONS = {"High": "🔴", "Medium": "🟡"}
+TASK_STATUS_ICONS = {"Overdue": "⚠️", "Due Today": "🕐"}
+
+def task_table(tasks):
+    return pd.DataFrame({
+        "Priority": tasks["Priority"].astype(object).map(PRIORITY_ICONS).fillna("🟢"),
+        "Status": tasks["Status"].map(TASK_STATUS_ICONS).fillna("📝") + " " + tasks["Status"],
+        "Task": tasks["Task"],
+        "Due": tasks["Due Date"].map(format_date),
+    })
+
+def events_in_range(events, start_date, end_date):
+    dates = events["Date"].to_numpy()
+    lo = np.searchsorted(dates, pd.Timestamp(start_date).to_datetime64(), side="left")
+    hi = np.searchsorted(dates, pd.Timestamp(end_date).to_datetime64(), side="right")
+    return events.iloc[lo:hi].copy()
+
 # -------------------- SIDEBAR --------------------
 st.sidebar.title("🎯 Sales CRM")
 st.sidebar.markdown("---")
@@ -419,12 +2721,18 @@ pages = [
 ]
 choice = st.sidebar.selectbox("Navigation", pages)
 
-# Quick stats in sidebar
-metrics = compute_advanced_metrics(df)
-st.sidebar.markdown("### Quick Stats")
-st.sidebar.metric("Total Prospects", metrics["total"])
-st.sidebar.metric("Active Deals", metrics["proposals"] + metrics["negotiations"])
-st.sidebar.metric("Pipeline Value", f"${metrics['total_pipeline']:,.0f}")
+# Quick stats in sidebar, refreshed on their own only by writes to QUICK_STATS_COLUMNS
+@st.fragment
+def quick_stats():
+    metrics = store.metrics.snapshot()
+    st.markdown("### Quick Stats")
+    st.metric("Total Prospects", metrics["total"])
+    st.metric("Active Deals", metrics["proposals"] + metrics["negotiations"])
+    st.metric("Pipeline Value", f"${metrics['total_pipeline']:,.0f}")
+
+with st.sidebar:
+    quick_stats()
+metrics = store.metrics.snapshot()
 
 # -------------------- DASHBOARD --------------------
 if choice == "🏠 Dashboard":
@@ -475,10 +2783,10 @@ if choice == "🏠 Dashboard":
     col1, col2 = st.columns(2)
     
     with col1:
-        st.plotly_chart(create_pipeline_funnel(df), use_container_width=True)
+        st.plotly_chart(store.cached("pipeline_funnel", create_pipeline_funnel), use_container_width=True)
     
     with col2:
-        st.plotly_chart(create_lead_score_distribution(df), use_container_width=True)
+        st.plotly_chart(store.cached("lead_score_distribution", create_lead_score_distribution), use_container_width=True)
 
     # Performance Overview
     st.markdown("---")
@@ -501,16 +2809,14 @@ if choice == "🏠 Dashboard":
     # Recent Activity
     st.markdown("---")
     st.subheader("🔥 Hot Prospects (Score > 85)")
-    hot_prospects = df[df["Lead Score"] > 85].sort_values("Lead Score", ascending=False)
+    order = store.cached(("sort_order", "Lead Score"), lambda data: build_sort_order(data, "Lead Score"))
+    hot_rows = store.cached(
+        "hot_prospects",
+        lambda data: sorted_rows(order, (data["Lead Score"] > 85).to_numpy(dtype=bool, na_value=False), len(data))
+    )
     
-    if not hot_prospects.empty:
-        for _, prospect in hot_prospects.iterrows():
-            with st.container():
-                col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
-                col1.write(f"**{prospect['Name']}** - {prospect['Company']}")
-                col2.write(f"Score: {prospect['Lead Score']}")
-                col3.write(f"Stage: {prospect['Deal Stage']}")
-                col4.write(f"Value: {prospect['Deal Value'] or 'TBD'}")
+    if len(hot_rows):
+        show_prospect_grid(df, hot_rows, ["Name", "Company", "Lead Score", "Deal Stage", "Deal Value"], key="hot", height=300)
     else:
         st.info("No high-scoring prospects yet. Focus on lead qualification!")
 
@@ -518,16 +2824,14 @@ if choice == "🏠 Dashboard":
     st.markdown("---")
     st.subheader("📋 Upcoming Follow-ups")
     
-    today = datetime.now().date()
-    upcoming = df[df["Next Follow Up"] != ""]
-    upcoming["Next Follow Up Date"] = pd.to_datetime(upcoming["Next Follow Up"]).dt.date
-    upcoming = upcoming[upcoming["Next Follow Up Date"] >= today].sort_values("Next Follow Up Date")
+    today = pd.Timestamp(datetime.now().date())
+    upcoming = df.loc[store.followups.due_from(today, len(df), limit=5)]
     
     if not upcoming.empty:
-        for _, task in upcoming.head(5).iterrows():
-            days_until = (task["Next Follow Up Date"] - today).days
+        for _, task in upcoming.iterrows():
+            days_until = (task["Next Follow Up"] - today).days
             urgency = "🔴" if days_until <= 1 else "🟡" if days_until <= 3 else "🟢"
-            st.write(f"{urgency} **{task['Name']}** ({task['Company']}) - {task['Next Follow Up Date']} ({days_until} days)")
+            st.write(f"{urgency} **{task['Name']}** ({task['Company']}) - {format_date(task['Next Follow Up'])} ({days_until} days)")
     else:
         st.info("No upcoming follow-ups scheduled.")
 
@@ -537,7 +2841,10 @@ elif choice == "👥 Prospects":
     
     tab1, tab2, tab3 = st.tabs(["🔍 Browse & Filter", "➕ Add New", "✏️ Bulk Edit"])
     
-    with tab1:
+    # Filters, grid and quick actions rerun on their own; the rest of the page is untouched
+    @st.fragment
+    def browse_prospects():
+        df = store.df
         st.subheader("Filter & Search Prospects")
         
         # Filters
@@ -545,51 +2852,47 @@ elif choice == "👥 Prospects":
         
         with col1:
             status_filter = st.multiselect(
-                "Lead Status", 
-                df["Lead Status"].unique(),
-                default=df["Lead Status"].unique()
+                "Lead Status",
+                store.filters.values("Lead Status"),
+                default=store.filters.values("Lead Status")
             )
         
         with col2:
             industry_filter = st.multiselect(
                 "Industry",
-                df["Industry"].unique(),
-                default=df["Industry"].unique()
+                store.filters.values("Industry"),
+                default=store.filters.values("Industry")
             )
         
         with col3:
             owner_filter = st.multiselect(
                 "Owner",
-                df["Owner"].unique(),
-                default=df["Owner"].unique()
+                store.filters.values("Owner"),
+                default=store.filters.values("Owner")
             )
         
         with col4:
             priority_filter = st.multiselect(
                 "Priority",
-                df["Priority"].unique(),
-                default=df["Priority"].unique()
+                store.filters.values("Priority"),
+                default=store.filters.values("Priority")
             )
 
         # Apply filters
-        filtered_df = df[
-            (df["Lead Status"].isin(status_filter)) &
-            (df["Industry"].isin(industry_filter)) &
-            (df["Owner"].isin(owner_filter)) &
-            (df["Priority"].isin(priority_filter))
-        ]
+        filter_mask = store.filters.select({
+            "Lead Status": status_filter,
+            "Industry": industry_filter,
+            "Owner": owner_filter,
+            "Priority": priority_filter,
+        }, size=len(df))
+        rows = np.flatnonzero(filter_mask)
 
         # Search functionality
         search_term = st.text_input("🔍 Search by name, company, or email:")
         if search_term:
-            mask = (
-                filtered_df["Name"].str.contains(search_term, case=False, na=False) |
-                filtered_df["Company"].str.contains(search_term, case=False, na=False) |
-                filtered_df["Email"].str.contains(search_term, case=False, na=False)
-            )
-            filtered_df = filtered_df[mask]
+            rows = store.search(search_term, filter_mask)
 
-        st.write(f"Showing {len(filtered_df)} of {len(df)} prospects")
+        st.write(f"Showing {len(rows)} of {len(df)} prospects")
 
         # Display prospects with enhanced formatting
         display_cols = [
@@ -597,49 +2900,46 @@ elif choice == "👥 Prospects":
             "Lead Status", "Deal Stage", "Lead Score", "Deal Value", "Next Follow Up"
         ]
         
-        # Color coding for status
-        styled_df = filtered_df[display_cols].copy()
-        st.dataframe(
-            styled_df,
-            use_container_width=True,
-            height=400
-        )
+        page_rows = show_prospect_grid(df, rows, display_cols, key="browse")
 
-        # Quick actions
-        if not filtered_df.empty:
+        # Quick actions, for the prospects on the visible page
+        if len(page_rows):
             st.markdown("### Quick Actions")
             col1, col2 = st.columns(2)
             
             with col1:
-                selected_id = st.selectbox("Select Prospect", filtered_df["Prospect ID"].tolist())
+                selected_id = st.selectbox("Select Prospect", df["Prospect ID"].iloc[page_rows].tolist())
                 action = st.selectbox("Action", ["Update Status", "Schedule Follow-up", "Add Note"])
                 
                 if action == "Update Status":
-                    new_status = st.selectbox("New Status", ["New", "Contacted", "Opened", "Replied", "Qualified", "Not Interested"])
+                    new_status = st.selectbox("New Status", LEAD_STATUSES)
                     if st.button("Update Status"):
-                        idx = df[df["Prospect ID"] == selected_id].index[0]
-                        st.session_state.df.at[idx, "Lead Status"] = new_status
+                        idx = store.row_for(selected_id)
+                        store.update(idx, "Lead Status", new_status)
                         st.success("Status updated!")
-                        st.experimental_rerun()
+                        rerun_after_write(["Lead Status"])
 
             with col2:
                 if action == "Schedule Follow-up":
                     follow_up_date = st.date_input("Follow-up Date", datetime.now() + timedelta(days=3))
                     if st.button("Schedule"):
-                        idx = df[df["Prospect ID"] == selected_id].index[0]
-                        st.session_state.df.at[idx, "Next Follow Up"] = follow_up_date.strftime("%Y-%m-%d")
+                        idx = store.row_for(selected_id)
+                        store.update(idx, "Next Follow Up", pd.Timestamp(follow_up_date))
                         st.success("Follow-up scheduled!")
-                        st.experimental_rerun()
+                        rerun_after_write(["Next Follow Up"])
                 
                 elif action == "Add Note":
                     new_note = st.text_area("Add Note")
                     if st.button("Add Note") and new_note:
-                        idx = df[df["Prospect ID"] == selected_id].index[0]
-                        current_notes = st.session_state.df.at[idx, "Notes"]
+                        idx = store.row_for(selected_id)
+                        current_notes = store.df.at[idx, "Notes"]
                         updated_notes = f"{current_notes}\n[{datetime.now().strftime('%Y-%m-%d')}] {new_note}" if current_notes else f"[{datetime.now().strftime('%Y-%m-%d')}] {new_note}"
-                        st.session_state.df.at[idx, "Notes"] = updated_notes
+                        store.update(idx, "Notes", updated_notes)
                         st.success("Note added!")
-                        st.experimental_rerun()
+                        rerun_after_write(["Notes"])
+
+    with tab1:
+        browse_prospects()
 
     with tab2:
         st.subheader("Add New Prospect")
@@ -679,12 +2979,12 @@ elif choice == "👥 Prospects":
                 st.markdown("**Additional Notes**")
                 new_notes = st.text_area("Notes", placeholder="Any additional context or observations")
             
+            allow_duplicate = st.checkbox("Add even if this prospect already exists")
             submitted = st.form_submit_button("Add Prospect", type="primary")
             
             if submitted:
                 if new_name and new_company and new_email:
                     new_prospect = {
-                        "Prospect ID": int(df["Prospect ID"].max() + 1) if not df.empty else 1,
                         "Name": new_name,
                         "Title / Role": new_title,
                         "Company": new_company,
@@ -722,9 +3022,17 @@ elif choice == "👥 Prospects":
                         "Budget": new_budget
                     }
                     
-                    st.session_state.df = pd.concat([st.session_state.df, pd.DataFrame([new_prospect])], ignore_index=True)
-                    st.success(f"✅ Added {new_name} from {new_company}!")
-                    st.experimental_rerun()
+                    duplicate = store.find_duplicate(new_prospect)
+                    if duplicate is not None and not allow_duplicate:
+                        existing = store.df.loc[duplicate]
+                        st.warning(
+                            f"⚠️ {existing['Name']} at {existing['Company']} (ID {existing['Prospect ID']}) "
+                            "matches this email or person. Tick the box above to add anyway."
+                        )
+                    else:
+                        store.append(pd.DataFrame([new_prospect]))
+                        st.success(f"✅ Added {new_name} from {new_company}!")
+                        st.rerun()
                 else:
                     st.error("Please fill in required fields: Name, Company, and Email")
 
@@ -738,33 +3046,35 @@ elif choice == "👥 Prospects":
             selected_prospects = st.multiselect(
                 "Select Prospects", 
                 df["Prospect ID"].tolist(),
-                format_func=lambda x: f"{x} - {df[df['Prospect ID']==x]['Name'].iloc[0]} ({df[df['Prospect ID']==x]['Company'].iloc[0]})"
+                format_func=lambda x: f"{x} - {df.at[store.row_for(x), 'Name']} ({df.at[store.row_for(x), 'Company']})"
             )
-            bulk_status = st.selectbox("New Status", ["New", "Contacted", "Opened", "Replied", "Qualified", "Not Interested"])
+            bulk_status = st.selectbox("New Status", LEAD_STATUSES, key="bulk_status")
             
             if st.button("Update Selected") and selected_prospects:
-                for prospect_id in selected_prospects:
-                    idx = df[df["Prospect ID"] == prospect_id].index[0]
-                    st.session_state.df.at[idx, "Lead Status"] = bulk_status
+                store.update_many(store.rows_for(selected_prospects), "Lead Status", bulk_status)
                 st.success(f"Updated {len(selected_prospects)} prospects!")
-                st.experimental_rerun()
+                st.rerun()
         
         with col2:
             st.markdown("**Import from CSV**")
             uploaded_file = st.file_uploader("Upload CSV file", type=['csv'])
+            if "bulk_import" in st.session_state:
+                show_import_report(st.session_state.pop("bulk_import"))
             if uploaded_file is not None:
                 try:
-                    new_df = pd.read_csv(uploaded_file)
                     st.write("Preview:")
-                    st.dataframe(new_df.head())
+                    st.dataframe(preview_import(uploaded_file))
                     
+                    policy = st.selectbox(
+                        "If a prospect already exists", list(DEDUPE_POLICIES), format_func=DEDUPE_POLICIES.get, key="bulk_policy"
+                    )
                     if st.button("Import Data"):
-                        # Add IDs and merge
-                        max_id = st.session_state.df["Prospect ID"].max()
-                        new_df["Prospect ID"] = range(max_id + 1, max_id + 1 + len(new_df))
-                        st.session_state.df = pd.concat([st.session_state.df, new_df], ignore_index=True)
-                        st.success(f"Imported {len(new_df)} prospects!")
-                        st.experimental_rerun()
+                        # Fresh IDs are assigned by the store on append
+                        st.session_state.bulk_import = import_prospects(
+                            store, read_import_chunks(uploaded_file), keep_ids=False, policy=policy,
+                            progress=import_progress(uploaded_file)
+                        )
+                        st.rerun()
                 except Exception as e:
                     st.error(f"Error importing file: {e}")
 
@@ -777,71 +3087,8 @@ elif choice == "✉️ Email Campaigns":
     with tab1:
         st.subheader("Email Templates")
         
-        # Email template library
-        templates = {
-            "Initial Outreach": {
-                "subject": "Quick question about [Company Name]'s [pain point]",
-                "body": """Hi [First Name],
-
-I noticed [Company Name] is [relevant observation about their business]. 
-
-Many companies in [industry] are facing similar challenges with [specific pain point]. We've helped businesses like yours [specific benefit/result].
-
-Would you be open to a brief conversation about how we could help [Company Name] achieve similar results?
-
-Best regards,
-[Your Name]
-[Your Title]
-[Company]"""
-            },
-            "Follow-up": {
-                "subject": "Following up on [Company Name] + [Your Company]",
-                "body": """Hi [First Name],
-
-I wanted to follow up on my previous email about helping [Company Name] with [pain point].
-
-I came across this case study of how [similar company] achieved [specific result] using our solution: [link or brief description]
-
-Would you like to see how this could apply to [Company Name]?
-
-Best,
-[Your Name]"""
-            },
-            "Value Proposition": {
-                "subject": "How [Competitor/Similar Company] reduced costs by 30%",
-                "body": """Hi [First Name],
-
-I thought you'd find this interesting:
-
-[Similar Company] recently implemented our AI solution and saw:
-• 30% reduction in operational costs
-• 50% faster processing times  
-• 90% accuracy improvement
-
-Given [Company Name]'s focus on [relevant area], I believe we could deliver similar results for you.
-
-Would you like a 15-minute call to explore this?
-
-Best regards,
-[Your Name]"""
-            },
-            "Final Attempt": {
-                "subject": "Should I close your file?",
-                "body": """Hi [First Name],
-
-I've reached out a few times about helping [Company Name] with [pain point], but haven't heard back.
-
-Should I assume this isn't a priority right now and close your file?
-
-If the timing isn't right, just let me know when might be better to reconnect.
-
-Best,
-[Your Name]"""
-            }
-        }
-        
-        selected_template = st.selectbox("Choose Template", list(templates.keys()))
-        template = templates[selected_template]
+        selected_template = st.selectbox("Choose Template", list(EMAIL_TEMPLATES.keys()))
+        template = EMAIL_TEMPLATES[selected_template]
         
         col1, col2 = st.columns(2)
         
@@ -853,16 +3100,48 @@ Best,
         
         edited_body = st.text_area("Email Body", value=template["body"], height=300)
         
+        col1, col2 = st.columns(2)
+        with col1:
+            preview_id = st.selectbox(
+                "Personalize for",
+                df["Prospect ID"].head(GRID_PAGE_SIZES[-1]).tolist(),
+                format_func=lambda x: f"{x} - {df.at[store.row_for(x), 'Name']} ({df.at[store.row_for(x), 'Company']})"
+            )
+        with col2:
+            test_recipient = st.text_input("Test Recipient", value=SMTP_SENDER)
+        preview_rows = df.loc[[store.row_for(preview_id)]] if preview_id is not None else df.head(0)
+        preview_subject, missing_subject = render_template(st.session_state.subject_edit, preview_rows)
+        preview_body, missing_body = render_template(edited_body, preview_rows)
+        
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("Save Template"):
                 st.success("Template saved!")
         with col2:
-            if st.button("Preview"):
-                st.info("Preview functionality would show personalized version")
+            if st.button("Preview") and not preview_rows.empty:
+                st.markdown(f"**Subject:** {preview_subject.iloc[0]}")
+                st.text(preview_body.iloc[0])
+                missing = missing_fields(pd.concat([missing_subject, missing_body], axis=1)).iloc[0]
+                if missing:
+                    st.warning(f"No value for: {missing}")
+                unfilled = unfilled_placeholders(st.session_state.subject_edit + "\n" + edited_body)
+                if unfilled:
+                    st.warning(f"Sent as written, fill these in first: {', '.join(unfilled)}")
         with col3:
-            if st.button("Test Send"):
-                st.info("Test email would be sent to your email")
+            if st.button("Test Send") and not preview_rows.empty:
+                if not SMTP_HOST:
+                    st.info("Set CRM_SMTP_HOST to send test emails through your SMTP relay.")
+                else:
+                    unfilled = unfilled_placeholders(st.session_state.subject_edit + "\n" + edited_body)
+                    if unfilled:
+                        st.warning(f"The test email still contains: {', '.join(unfilled)}")
+                    results = []
+                    test_email = compose_email(test_recipient, preview_subject.iloc[0], preview_body.iloc[0])
+                    asyncio.run(deliver([(test_recipient, test_email)], lambda key, status: results.append(status)))
+                    if results == ["Sent"]:
+                        st.success(f"Test email sent to {test_recipient}")
+                    else:
+                        st.error(f"The SMTP relay did not accept the test email to {test_recipient}")
 
     with tab2:
         st.subheader("Send Email Campaigns")
@@ -875,16 +3154,16 @@ Best,
         with col1:
             # Target selection
             st.markdown("**Target Audience**")
-            target_status = st.multiselect("Target Lead Status", df["Lead Status"].unique(), default=["New"])
-            target_industry = st.multiselect("Target Industry", df["Industry"].unique())
-            target_priority = st.multiselect("Target Priority", df["Priority"].unique())
+            target_status = st.multiselect("Target Lead Status", LEAD_STATUSES, default=["New"])
+            target_industry = st.multiselect("Target Industry", store.filters.values("Industry"))
+            target_priority = st.multiselect("Target Priority", store.filters.values("Priority"))
             
-            # Filter targets
-            targets = df[
-                (df["Lead Status"].isin(target_status)) &
-                (df["Industry"].isin(target_industry) if target_industry else df["Industry"].notna()) &
-                (df["Priority"].isin(target_priority) if target_priority else df["Priority"].notna())
-            ]
+            # Filter targets; an empty industry/priority selection means any value
+            targets = df[store.filters.select({
+                "Lead Status": target_status,
+                "Industry": target_industry or store.filters.values("Industry"),
+                "Priority": target_priority or store.filters.values("Priority"),
+            }, size=len(df))]
             
             st.write(f"**Targets: {len(targets)} prospects**")
             if not targets.empty:
@@ -892,74 +3171,109 @@ Best,
         
         with col2:
             st.markdown("**Campaign Settings**")
-            email_template = st.selectbox("Email Template", list(templates.keys()))
+            email_template = st.selectbox("Email Template", list(EMAIL_TEMPLATES.keys()))
             send_date = st.date_input("Send Date", datetime.now())
             send_time = st.time_input("Send Time", datetime.now().time())
             
-            # Personalization options
-            st.checkbox("Auto-personalize company name", value=True)
-            st.checkbox("Auto-personalize industry", value=True)
-            st.checkbox("Include pain points", value=True)
+            # Personalization options; unticked placeholders are sent as written
+            fields = {"first name"}
+            for option, option_fields in PERSONALIZE_OPTIONS.items():
+                if st.checkbox(option, value=True):
+                    fields.update(option_fields)
+            
+            campaign_template = EMAIL_TEMPLATES[email_template]
+            unfilled = unfilled_placeholders(campaign_template["subject"] + "\n" + campaign_template["body"], fields)
+            if unfilled:
+                st.warning(f"These placeholders are not filled from prospect data and would be sent as written: {', '.join(unfilled)}")
+            # Sending them needs an explicit go-ahead; a recorded-only launch sends nothing
+            send_unfilled = not (unfilled and SMTP_HOST) or st.checkbox("Send with these placeholders as written", value=False)
+            
+            if not targets.empty:
+                missing = pd.concat([
+                    template_missing(campaign_template["subject"], targets, fields),
+                    template_missing(campaign_template["body"], targets, fields),
+                ], axis=1)
+                incomplete = missing.any(axis=1)
+                if incomplete.any():
+                    st.warning(f"{int(incomplete.sum())} targets are missing personalization fields; those render empty.")
+                    st.dataframe(
+                        pd.DataFrame({
+                            "Name": targets.loc[incomplete, "Name"],
+                            "Missing": missing_fields(missing.loc[incomplete]),
+                        }).head(GRID_PAGE_SIZES[-1]),
+                        hide_index=True,
+                        height=150
+                    )
+            
+            if "last_queued" in st.session_state:
+                queued_name, queued, scheduled = st.session_state.pop("last_queued")
+                st.success(f"📬 Campaign '{queued_name}' queued for {queued} prospects, sending from {scheduled:%Y-%m-%d %H:%M}.")
+            
+            if "last_launch" in st.session_state:
+                launched_name, summary = st.session_state.pop("last_launch")
+                st.success(f"🚀 Campaign '{launched_name}' launched to {summary['sent']} prospects!")
+                st.write(" | ".join(f"{slot}: {summary[slot]}" for slot in ["Email 1", "Email 2", "Email 3"]))
+                if summary["failed"]:
+                    st.warning(f"{summary['failed']} emails could not be delivered; their status is {EMAIL_SEND_FAILED}.")
+                if summary["skipped"]:
+                    st.warning(f"Skipped {summary['skipped']} prospects whose three email slots are already used.")
             
             if st.button("Launch Campaign", type="primary"):
-                if not targets.empty:
-                    # Simulate sending emails
-                    for idx, prospect in targets.iterrows():
-                        # Update first available email slot
-                        df_idx = df[df["Prospect ID"] == prospect["Prospect ID"]].index[0]
-                        if not st.session_state.df.at[df_idx, "Email 1 Date"]:
-                            st.session_state.df.at[df_idx, "Email 1 Date"] = send_date.strftime("%Y-%m-%d")
-                            st.session_state.df.at[df_idx, "Email 1 Status"] = "Sent"
-                        elif not st.session_state.df.at[df_idx, "Email 2 Date"]:
-                            st.session_state.df.at[df_idx, "Email 2 Date"] = send_date.strftime("%Y-%m-%d")
-                            st.session_state.df.at[df_idx, "Email 2 Status"] = "Sent"
-                        elif not st.session_state.df.at[df_idx, "Email 3 Date"]:
-                            st.session_state.df.at[df_idx, "Email 3 Date"] = send_date.strftime("%Y-%m-%d")
-                            st.session_state.df.at[df_idx, "Email 3 Status"] = "Sent"
-                        
-                        # Update lead status
-                        if st.session_state.df.at[df_idx, "Lead Status"] == "New":
-                            st.session_state.df.at[df_idx, "Lead Status"] = "Contacted"
-                    
-                    st.success(f"🚀 Campaign '{campaign_name}' launched to {len(targets)} prospects!")
-                    st.experimental_rerun()
+                if not send_unfilled:
+                    st.error("Fill in the template's placeholders, or confirm sending them as written.")
+                elif not targets.empty and SMTP_HOST:
+                    # Sending runs in the background worker; progress shows below
+                    scheduled = datetime.combine(send_date, send_time)
+                    queue_campaign(
+                        store, campaign_queue, campaign_name, targets.index,
+                        EMAIL_TEMPLATES[email_template], fields, send_date, scheduled
+                    )
+                    get_campaign_worker().wake.set()
+                    st.session_state.last_queued = (campaign_name, len(targets), scheduled)
+                    st.rerun()
+                elif not targets.empty:
+                    # No relay configured: record the campaign without sending
+                    summary = store.launch_campaign(targets.index, send_date)
+                    st.session_state.last_launch = (campaign_name, summary)
+                    st.rerun()
                 else:
                     st.warning("No targets selected for campaign")
 
+        # Queued campaigns, refreshed on their own while any job is waiting
+        @st.fragment(run_every=CAMPAIGN_REFRESH_SECONDS if campaign_queue.pending() else None)
+        def campaign_progress():
+            campaigns = campaign_queue.progress()
+            if campaigns.empty:
+                return
+            st.markdown("**Queued Campaigns**")
+            if SMTP_HOST:
+                st.metric("Throughput", f"{get_campaign_worker().rate()} emails/min")
+            for campaign in campaigns.head(GRID_PAGE_SIZES[0]).itertuples(index=False):
+                done = campaign.total - sum(getattr(campaign, state) for state in JOB_PENDING)
+                st.progress(done / campaign.total, text=f"{campaign.name or 'Untitled'}: {done} of {campaign.total} done")
+                st.caption(" | ".join(f"{state}: {getattr(campaign, state)}" for state in JOB_STATES))
+        
+        campaign_progress()
+
     with tab3:
         st.subheader("Email Performance Analytics")
         
         # Performance by template/campaign
-        email_performance = []
-        for _, row in df.iterrows():
-            for i in range(1, 4):
-                email_date = row.get(f"Email {i} Date", "")
-                email_status = row.get(f"Email {i} Status", "")
-                if email_date and email_status:
-                    email_performance.append({
-                        "Email": f"Email {i}",
-                        "Date": email_date,
-                        "Status": email_status,
-                        "Prospect": row["Name"],
-                        "Industry": row["Industry"]
-                    })
-        
-        if email_performance:
-            perf_df = pd.DataFrame(email_performance)
+        perf_df = store.cached("email_performance", build_email_performance)
+        
+        if not perf_df.empty:
             
             # Email performance charts
+            status_fig, industry_fig = store.cached(
+                "email_performance_charts", lambda data: create_email_performance_charts(perf_df)
+            )
             col1, col2 = st.columns(2)
             
             with col1:
-                status_counts = perf_df["Status"].value_counts()
-                fig = px.pie(values=status_counts.values, names=status_counts.index, title="Email Status Distribution")
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(status_fig, use_container_width=True)
             
             with col2:
-                industry_performance = perf_df.groupby("Industry")["Status"].apply(lambda x: (x == "Opened").sum()).reset_index()
-                industry_performance.columns = ["Industry", "Opens"]
-                fig = px.bar(industry_performance, x="Industry", y="Opens", title="Opens by Industry")
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(industry_fig, use_container_width=True)
             
             # Detailed performance table
             st.markdown("**Email Performance Details**")
@@ -982,18 +3296,21 @@ Best,
         
         with col1:
             st.markdown("**Active Sequences**")
-            active_sequences = df[
-                (df["Email 1 Status"].isin(["Sent", "Opened"])) & 
-                (df["Email 3 Status"] == "")
-            ]
+            active_sequences = store.cached("active_sequences", lambda data: data[
+                (data["Email 1 Status"].isin(["Sent", "Opened"])) & 
+                (data["Email 3 Status"].isna())
+            ])
             
             if not active_sequences.empty:
-                for _, seq in active_sequences.iterrows():
-                    with st.container():
-                        st.write(f"**{seq['Name']}** ({seq['Company']})")
-                        st.write(f"Status: {seq['Lead Status']} | Next: Email {2 if not seq['Email 2 Date'] else 3}")
-                        if st.button(f"Pause Sequence", key=f"pause_{seq['Prospect ID']}"):
-                            st.info(f"Sequence paused for {seq['Name']}")
+                page = active_sequences.iloc[page_slice(len(active_sequences), "sequences", default_size=0)]
+                sequences = pd.DataFrame({
+                    "Prospect": page["Name"] + " (" + page["Company"] + ")",
+                    "Status": page["Lead Status"],
+                    "Next": np.where(page["Email 2 Date"].isna(), "Email 2", "Email 3"),
+                })
+                paused = select_rows(sequences, "pause_sequences", "Pause", "Pause Selected")
+                if len(paused):
+                    st.info(f"Sequence paused for {', '.join(page['Name'].iloc[paused])}")
             else:
                 st.info("No active sequences")
         
@@ -1025,70 +3342,10 @@ elif choice == "📅 Calendar & Tasks":
             end_date = st.date_input("End Date", datetime.now() + timedelta(days=30))
         
         # Build comprehensive calendar events
-        events = []
-        for _, row in df.iterrows():
-            # Email events
-            for i, (col_label, event_type) in enumerate([
-                ("Email 1 Date", "Email 1"), 
-                ("Email 2 Date", "Email 2"), 
-                ("Email 3 Date", "Email 3")
-            ], 1):
-                date_val = row.get(col_label, "")
-                status = row.get(f"Email {i} Status", "")
-                if date_val:
-                    try:
-                        date_parsed = pd.to_datetime(date_val).date()
-                        if start_date <= date_parsed <= end_date:
-                            events.append({
-                                "Date": date_parsed,
-                                "Type": event_type,
-                                "Prospect": row["Name"],
-                                "Company": row["Company"],
-                                "Status": status,
-                                "Priority": row["Priority"],
-                                "Owner": row["Owner"]
-                            })
-                    except:
-                        pass
-            
-            # Call/Demo events
-            call_date = row.get("Call / Demo Date", "")
-            if call_date:
-                try:
-                    date_parsed = pd.to_datetime(call_date).date()
-                    if start_date <= date_parsed <= end_date:
-                        events.append({
-                            "Date": date_parsed,
-                            "Type": "Call/Demo",
-                            "Prospect": row["Name"],
-                            "Company": row["Company"],
-                            "Status": "Scheduled",
-                            "Priority": row["Priority"],
-                            "Owner": row["Owner"]
-                        })
-                except:
-                    pass
-            
-            # Follow-up events
-            followup_date = row.get("Next Follow Up", "")
-            if followup_date:
-                try:
-                    date_parsed = pd.to_datetime(followup_date).date()
-                    if start_date <= date_parsed <= end_date:
-                        events.append({
-                            "Date": date_parsed,
-                            "Type": "Follow-up",
-                            "Prospect": row["Name"],
-                            "Company": row["Company"],
-                            "Status": "Scheduled",
-                            "Priority": row["Priority"],
-                            "Owner": row["Owner"]
-                        })
-                except:
-                    pass
-
-        if events:
-            events_df = pd.DataFrame(events).sort_values("Date")
+        events_df = events_in_range(store.cached("calendar_events", build_calendar_events), start_date, end_date)
+
+        if not events_df.empty:
+            events_df["Date"] = events_df["Date"].dt.date
             
             # Filter by owner
             owner_filter = st.multiselect("Filter by Owner", events_df["Owner"].unique(), default=events_df["Owner"].unique())
@@ -1115,92 +3372,32 @@ elif choice == "📅 Calendar & Tasks":
         else:
             st.info("No events in selected date range.")
 
-    with tab2:
+    # Completing a task only changes this list, so it reruns on its own
+    @st.fragment
+    def task_list():
         st.subheader("Task Management")
         
         # Create tasks from prospect data
-        tasks = []
         today = datetime.now().date()
-        
-        for _, row in df.iterrows():
-            # Overdue follow-ups
-            next_followup = row.get("Next Follow Up", "")
-            if next_followup:
-                try:
-                    followup_date = pd.to_datetime(next_followup).date()
-                    if followup_date <= today:
-                        tasks.append({
-                            "Task": f"Follow up with {row['Name']}",
-                            "Prospect": row["Name"],
-                            "Company": row["Company"],
-                            "Due Date": followup_date,
-                            "Priority": row["Priority"],
-                            "Type": "Follow-up",
-                            "Status": "Overdue" if followup_date < today else "Due Today"
-                        })
-                except:
-                    pass
-            
-            # Proposals requiring follow-up
-            if row["Deal Stage"] == "Proposal Sent":
-                last_contact = row.get("Last Contact", "")
-                if last_contact:
-                    try:
-                        last_date = pd.to_datetime(last_contact).date()
-                        days_since = (today - last_date).days
-                        if days_since >= 7:
-                            tasks.append({
-                                "Task": f"Follow up on proposal with {row['Name']}",
-                                "Prospect": row["Name"],
-                                "Company": row["Company"],
-                                "Due Date": today,
-                                "Priority": "High",
-                                "Type": "Proposal Follow-up",
-                                "Status": "Overdue"
-                            })
-                    except:
-                        pass
-            
-            # New prospects requiring initial contact
-            if row["Lead Status"] == "New":
-                date_added = pd.to_datetime(row["Date Added"]).date()
-                days_since_added = (today - date_added).days
-                if days_since_added >= 1:
-                    tasks.append({
-                        "Task": f"Initial outreach to {row['Name']}",
-                        "Prospect": row["Name"],
-                        "Company": row["Company"],
-                        "Due Date": today,
-                        "Priority": row["Priority"],
-                        "Type": "Initial Contact",
-                        "Status": "Pending"
-                    })
-
-        if tasks:
-            tasks_df = pd.DataFrame(tasks)
-            
-            # Sort by priority and due date
-            priority_order = {"High": 3, "Medium": 2, "Low": 1}
-            tasks_df["Priority Score"] = tasks_df["Priority"].map(priority_order)
-            tasks_df = tasks_df.sort_values(["Priority Score", "Due Date"], ascending=[False, True])
-            
-            # Display tasks with status colors
+        tasks_df = store.cached(("tasks", today), lambda data: build_tasks(data, today))
+        tasks_df = tasks_df[~task_keys(tasks_df).isin(store.completed_tasks)]
+
+        if not tasks_df.empty:
+            # Display tasks with status colors, one page at a time
             st.markdown("### 📋 Your Tasks")
-            for _, task in tasks_df.iterrows():
-                priority_icon = "🔴" if task["Priority"] == "High" else "🟡" if task["Priority"] == "Medium" else "🟢"
-                status_icon = "⚠️" if task["Status"] == "Overdue" else "🕐" if task["Status"] == "Due Today" else "📝"
-                
-                col1, col2, col3 = st.columns([6, 2, 2])
-                with col1:
-                    st.write(f"{priority_icon} {status_icon} {task['Task']}")
-                with col2:
-                    st.write(f"Due: {task['Due Date']}")
-                with col3:
-                    if st.button("Complete", key=f"complete_{task['Prospect']}_{task['Type']}"):
-                        st.success("Task completed!")
+            page = tasks_df.iloc[page_slice(len(tasks_df), "tasks")]
+            done = select_rows(task_table(page), "complete_tasks", "Done", "Complete Selected")
+            if len(done):
+                store.complete_tasks(task_keys(page.iloc[done]))
+                st.success(f"Completed {len(done)} tasks!")
+                # No prospect column changed, only the shared completed set
+                rerun_after_write([])
         else:
             st.success("🎉 No pending tasks! Great job staying on top of everything.")
 
+    with tab2:
+        task_list()
+
     with tab3:
         st.subheader("Automated Reminders")
         
@@ -1222,26 +3419,16 @@ elif choice == "📅 Calendar & Tasks":
             st.markdown("**Upcoming Reminders**")
             
             # Generate reminders
-            reminders = []
-            for _, row in df.iterrows():
-                # Follow-up reminders
-                next_followup = row.get("Next Follow Up", "")
-                if next_followup:
-                    try:
-                        followup_date = pd.to_datetime(next_followup).date()
-                        remind_date = followup_date - timedelta(days=remind_followup)
-                        if remind_date >= datetime.now().date():
-                            reminders.append({
-                                "Date": remind_date,
-                                "Type": "Follow-up Reminder",
-                                "Message": f"Follow up with {row['Name']} tomorrow",
-                                "Priority": row["Priority"]
-                            })
-                    except:
-                        pass
+            remind_days = timedelta(days=remind_followup)
+            due = df.loc[store.followups.due_from(datetime.now().date() + remind_days, len(df))]
             
-            if reminders:
-                reminders_df = pd.DataFrame(reminders).sort_values("Date")
+            if not due.empty:
+                reminders_df = pd.DataFrame({
+                    "Date": (due["Next Follow Up"] - remind_days).dt.date,
+                    "Type": "Follow-up Reminder",
+                    "Message": "Follow up with " + due["Name"] + " tomorrow",
+                    "Priority": due["Priority"]
+                })
                 st.dataframe(reminders_df, use_container_width=True)
             else:
                 st.info("No upcoming reminders")
@@ -1256,12 +3443,10 @@ elif choice == "📊 Analytics":
         st.subheader("Sales Conversion Funnel")
         
         # Enhanced funnel with conversion rates
-        metrics = compute_advanced_metrics(df)
-        
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            st.plotly_chart(create_pipeline_funnel(df), use_container_width=True)
+            st.plotly_chart(store.cached("pipeline_funnel", create_pipeline_funnel), use_container_width=True)
         
         with col2:
             st.markdown("**Conversion Rates**")
@@ -1283,57 +3468,17 @@ elif choice == "📊 Analytics":
         
         with col1:
             # By Industry
-            industry_funnel = df.groupby("Industry").agg({
-                "Lead Status": lambda x: (x != "New").sum(),
-                "Deal Stage": lambda x: (x == "Meeting Scheduled").sum()
-            }).reset_index()
-            industry_funnel.columns = ["Industry", "Contacted", "Meetings"]
-            
-            fig = px.bar(
-                industry_funnel, 
-                x="Industry", 
-                y=["Contacted", "Meetings"],
-                title="Funnel Performance by Industry",
-                barmode="group"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(store.cached("industry_funnel", create_industry_funnel), use_container_width=True)
         
         with col2:
             # By Lead Source
-            source_funnel = df.groupby("Source").agg({
-                "Lead Status": lambda x: (x != "New").sum(),
-                "Deal Stage": lambda x: (x.isin(["Meeting Scheduled", "Proposal Sent"])).sum()
-            }).reset_index()
-            source_funnel.columns = ["Source", "Contacted", "Advanced"]
-            
-            fig = px.bar(
-                source_funnel,
-                x="Source",
-                y=["Contacted", "Advanced"],
-                title="Performance by Lead Source",
-                barmode="group"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(store.cached("source_funnel", create_source_funnel), use_container_width=True)
 
     with tab2:
         st.subheader("Sales Trends & Forecasting")
         
         # Time-based analysis
-        df_temp = df.copy()
-        df_temp["Date Added"] = pd.to_datetime(df_temp["Date Added"])
-        df_temp["Week"] = df_temp["Date Added"].dt.to_period("W")
-        
-        weekly_adds = df_temp.groupby("Week").size().reset_index()
-        weekly_adds.columns = ["Week", "New Prospects"]
-        weekly_adds["Week"] = weekly_adds["Week"].astype(str)
-        
-        fig = px.line(
-            weekly_adds,
-            x="Week",
-            y="New Prospects",
-            title="Weekly Prospect Addition Trend",
-            markers=True
-        )
+        fig = store.cached("weekly_trend", lambda data: create_weekly_trend(store.date_added.counts_by("W")))
         st.plotly_chart(fig, use_container_width=True)
         
         # Activity trends
@@ -1342,35 +3487,13 @@ elif choice == "📊 Analytics":
         
         with col1:
             # Email activity over time
-            email_dates = []
-            for _, row in df.iterrows():
-                for col in ["Email 1 Date", "Email 2 Date", "Email 3 Date"]:
-                    date_val = row.get(col, "")
-                    if date_val:
-                        try:
-                            email_dates.append(pd.to_datetime(date_val).date())
-                        except:
-                            pass
-            
-            if email_dates:
-                email_series = pd.Series(email_dates).value_counts().sort_index()
-                fig = px.line(
-                    x=email_series.index,
-                    y=email_series.values,
-                    title="Email Activity Timeline",
-                    markers=True
-                )
+            fig = store.cached("email_timeline", create_email_timeline)
+            if fig is not None:
                 st.plotly_chart(fig, use_container_width=True)
         
         with col2:
             # Lead score trends
-            fig = px.box(
-                df,
-                x="Lead Status",
-                y="Lead Score",
-                title="Lead Score Distribution by Status"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(store.cached("score_by_status", create_score_by_status), use_container_width=True)
 
     with tab3:
         st.subheader("Lead Scoring Analysis")
@@ -1380,46 +3503,31 @@ elif choice == "📊 Analytics":
         
         with col1:
             # Score distribution
-            st.plotly_chart(create_lead_score_distribution(df), use_container_width=True)
+            st.plotly_chart(store.cached("lead_score_distribution", create_lead_score_distribution), use_container_width=True)
             
             # Score statistics
             st.markdown("**Lead Score Statistics**")
-            st.metric("Average Score", f"{df['Lead Score'].mean():.1f}")
-            st.metric("Highest Score", f"{df['Lead Score'].max()}")
-            st.metric("Lowest Score", f"{df['Lead Score'].min()}")
+            score_stats = store.cached(
+                "lead_score_stats", lambda data: (data["Lead Score"].mean(), data["Lead Score"].max(), data["Lead Score"].min())
+            )
+            st.metric("Average Score", f"{score_stats[0]:.1f}")
+            st.metric("Highest Score", f"{score_stats[1]}")
+            st.metric("Lowest Score", f"{score_stats[2]}")
         
         with col2:
             # Scoring factors analysis
             st.markdown("**Top Scoring Prospects**")
-            top_prospects = df.nlargest(5, "Lead Score")
-            
-            for _, prospect in top_prospects.iterrows():
-                with st.container():
-                    col_a, col_b, col_c = st.columns([3, 1, 1])
-                    col_a.write(f"**{prospect['Name']}** - {prospect['Company']}")
-                    col_b.write(f"Score: {prospect['Lead Score']}")
-                    col_c.write(f"{prospect['Deal Stage']}")
+            top_prospects = store.cached("top_prospects", lambda data: data.nlargest(5, "Lead Score"))
+            st.dataframe(
+                top_prospects[["Name", "Company", "Lead Score", "Deal Stage"]],
+                hide_index=True,
+                use_container_width=True
+            )
             
             # Score correlation analysis
             st.markdown("**Score vs Engagement**")
-            correlation_data = []
-            for _, row in df.iterrows():
-                correlation_data.append({
-                    "Lead Score": row["Lead Score"],
-                    "Email Engagement": row["Opened Emails"] + (row["Replies"] * 2),
-                    "Company": row["Company"]
-                })
-            
-            if correlation_data:
-                corr_df = pd.DataFrame(correlation_data)
-                fig = px.scatter(
-                    corr_df,
-                    x="Lead Score",
-                    y="Email Engagement",
-                    hover_data=["Company"],
-                    title="Lead Score vs Email Engagement",
-                    trendline="ols"
-                )
+            fig = store.cached("score_vs_engagement", create_score_vs_engagement)
+            if fig is not None:
                 st.plotly_chart(fig, use_container_width=True)
 
     with tab4:
@@ -1429,71 +3537,30 @@ elif choice == "📊 Analytics":
         col1, col2 = st.columns(2)
         
         with col1:
-            st.plotly_chart(create_revenue_by_industry(df), use_container_width=True)
+            st.plotly_chart(store.cached("revenue_by_industry", create_revenue_by_industry), use_container_width=True)
         
         with col2:
             # Deal size by company size
-            def parse_deal_value(x):
-                try:
-                    val = str(x).replace("$", "").replace(",", "")
-                    if "K" in val:
-                        return float(val.replace("K", "")) * 1000
-                    elif "M" in val:
-                        return float(val.replace("M", "")) * 1000000
-                    else:
-                        return float(val) if val else 0
-                except:
-                    return 0
-            
-            df_temp = df.copy()
-            df_temp["Deal Value Numeric"] = df_temp["Deal Value"].apply(parse_deal_value)
-            
-            size_revenue = df_temp.groupby("Company Size")["Deal Value Numeric"].mean().reset_index()
-            
-            fig = px.bar(
-                size_revenue,
-                x="Company Size",
-                y="Deal Value Numeric",
-                title="Average Deal Size by Company Size",
-                color_discrete_sequence=["#FF6B35"]
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(store.cached("deal_size_by_company_size", create_deal_size_by_company_size), use_container_width=True)
         
         # Revenue forecasting
         st.markdown("---")
         st.subheader("Revenue Forecast")
+        forecast = store.cached("revenue_forecast", build_revenue_forecast)
         
         col1, col2, col3 = st.columns(3)
         
         with col1:
             # Conservative estimate (high probability deals)
-            high_prob_deals = df[df["Deal Stage"].isin(["Negotiation", "Proposal Sent"])]
-            conservative_forecast = high_prob_deals["Deal Value"].apply(parse_deal_value).sum() * 0.7
-            st.metric("Conservative (70%)", f"${conservative_forecast:,.0f}")
+            st.metric("Conservative (70%)", f"${forecast['conservative']:,.0f}")
         
         with col2:
             # Optimistic estimate (all active deals)
-            active_deals = df[df["Deal Stage"] != "Prospecting"]
-            optimistic_forecast = active_deals["Deal Value"].apply(parse_deal_value).sum()
-            st.metric("Optimistic (100%)", f"${optimistic_forecast:,.0f}")
+            st.metric("Optimistic (100%)", f"${forecast['optimistic']:,.0f}")
         
         with col3:
             # Weighted forecast based on stage
-            stage_weights = {
-                "Prospecting": 0.1,
-                "Meeting Scheduled": 0.2,
-                "Proposal Sent": 0.5,
-                "Negotiation": 0.8,
-                "Closed Won": 1.0
-            }
-            
-            weighted_forecast = 0
-            for _, row in df.iterrows():
-                deal_value = parse_deal_value(row["Deal Value"])
-                weight = stage_weights.get(row["Deal Stage"], 0)
-                weighted_forecast += deal_value * weight
-            
-            st.metric("Weighted Forecast", f"${weighted_forecast:,.0f}")
+            st.metric("Weighted Forecast", f"${forecast['weighted']:,.0f}")
 
 # -------------------- SETTINGS --------------------
 elif choice == "⚙️ Settings":
@@ -1562,60 +3629,43 @@ elif choice == "⚙️ Settings":
         with col1:
             st.markdown("**Export Options**")
             
-            export_format = st.selectbox("Export Format", ["CSV", "Excel", "JSON"])
+            export_format = st.selectbox("Export Format", list(EXPORT_FORMATS))
             export_filter = st.selectbox("Export Filter", ["All Prospects", "Active Deals Only", "High Priority Only"])
             
             # Filter data based on selection
             if export_filter == "Active Deals Only":
-                export_df = df[df["Deal Stage"] != "Prospecting"]
+                export_rows = np.flatnonzero((df["Deal Stage"] != "Prospecting").to_numpy())
             elif export_filter == "High Priority Only":
-                export_df = df[df["Priority"] == "High"]
+                export_rows = np.flatnonzero(store.filters.select({"Priority": ["High"]}, size=len(df)))
             else:
-                export_df = df
+                export_rows = None
             
-            if export_format == "CSV":
-                csv_data = export_df.to_csv(index=False).encode("utf-8")
-                st.download_button(
-                    "📥 Download CSV",
-                    csv_data,
-                    f"prospects_export_{datetime.now().strftime('%Y%m%d')}.csv",
-                    "text/csv"
-                )
-            elif export_format == "JSON":
-                json_data = export_df.to_json(orient="records", indent=2)
-                st.download_button(
-                    "📥 Download JSON",
-                    json_data,
-                    f"prospects_export_{datetime.now().strftime('%Y%m%d')}.json",
-                    "application/json"
-                )
+            # The file is only written once asked for, not on every rerun of this page
+            if st.button("📦 Prepare Export"):
+                export_download(f"📥 Download {export_format}", export_chunks(df, export_rows), export_format, f"prospects_export_{datetime.now().strftime('%Y%m%d')}")
         
         with col2:
             st.markdown("**Import Data**")
             
-            uploaded_file = st.file_uploader("Choose file", type=['csv', 'xlsx', 'json'])
+            uploaded_file = st.file_uploader("Choose file", type=['csv', 'xlsx', 'json', 'ndjson', 'jsonl'])
+            if "settings_import" in st.session_state:
+                show_import_report(st.session_state.pop("settings_import"))
             
             if uploaded_file is not None:
                 try:
-                    if uploaded_file.name.endswith('.csv'):
-                        new_data = pd.read_csv(uploaded_file)
-                    elif uploaded_file.name.endswith('.xlsx'):
-                        new_data = pd.read_excel(uploaded_file)
-                    elif uploaded_file.name.endswith('.json'):
-                        new_data = pd.read_json(uploaded_file)
-                    
                     st.write("Preview imported data:")
-                    st.dataframe(new_data.head())
+                    st.dataframe(preview_import(uploaded_file))
                     
+                    policy = st.selectbox(
+                        "If a prospect already exists", list(DEDUPE_POLICIES), format_func=DEDUPE_POLICIES.get, key="settings_policy"
+                    )
                     if st.button("Import Data"):
-                        # Add prospect IDs if missing
-                        if "Prospect ID" not in new_data.columns:
-                            max_id = st.session_state.df["Prospect ID"].max()
-                            new_data["Prospect ID"] = range(max_id + 1, max_id + 1 + len(new_data))
-                        
-                        st.session_state.df = pd.concat([st.session_state.df, new_data], ignore_index=True)
-                        st.success(f"Successfully imported {len(new_data)} prospects!")
-                        st.experimental_rerun()
+                        # Missing or clashing prospect IDs are reassigned by the store
+                        st.session_state.settings_import = import_prospects(
+                            store, read_import_chunks(uploaded_file), policy=policy,
+                            progress=import_progress(uploaded_file)
+                        )
+                        st.rerun()
                         
                 except Exception as e:
                     st.error(f"Error importing file: {e}")
@@ -1628,21 +3678,37 @@ elif choice == "⚙️ Settings":
         with col1:
             st.markdown("**Database Management**")
             
-            if st.button("🗑️ Clear All Data", type="secondary"):
-                if st.checkbox("I understand this will delete all data"):
-                    st.session_state.df = load_demo_data()
-                    st.success("Data reset to demo state!")
-                    st.experimental_rerun()
+            backups = BackupChain()
+            backup_entries = backups.entries()
+            restore_point = st.selectbox(
+                "Roll back to",
+                [None] + list(range(len(backup_entries)))[::-1],
+                format_func=lambda i: "Demo data" if i is None else
+                    f"{backup_entries[i]['created']} ({backup_entries[i]['kind']}, {backup_entries[i]['rows']} rows)"
+            )
+            confirm_clear = st.checkbox("I understand this will replace all current data")
+            if st.button("🗑️ Clear All Data", type="secondary") and confirm_clear:
+                if restore_point is None:
+                    store.reset(normalize_prospects(load_demo_data()))
+                else:
+                    store.reset(backups.restore(restore_point))
+                st.success("Data restored!")
+                st.rerun()
+            
+            if st.button("🔍 Verify Metrics"):
+                mismatched = store.metrics.verify(store.df)
+                if mismatched:
+                    st.warning(f"Running metrics drifted on {', '.join(mismatched)}; rebuilt from data.")
+                    store.metrics.rebuild(store.df)
+                else:
+                    st.success("Running metrics match a full recount.")
             
             st.markdown("**Backup & Restore**")
             if st.button("💾 Create Backup"):
-                backup_data = st.session_state.df.to_json(orient="records", indent=2)
-                st.download_button(
-                    "Download Backup",
-                    backup_data,
-                    f"crm_backup_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
-                    "application/json"
-                )
+                entry = BackupChain().create(store)
+                st.success(f"Saved {entry['kind']} backup: {entry['rows']} rows, {entry['bytes'] / 1024:.0f} KB")
+                with open(BackupChain().path(entry), "rb") as backup_file:
+                    st.download_button("Download Backup", backup_file.read(), entry["file"], EXPORT_FORMATS["Parquet"][1])
         
         with col2:
             st.markdown("**Integration Settings**")
@@ -1667,16 +3733,16 @@ else:
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        status_filter = st.multiselect("Lead Status", df["Lead Status"].unique(), default=df["Lead Status"].unique())
-        industry_filter = st.multiselect("Industry", df["Industry"].unique(), default=df["Industry"].unique())
+        status_filter = st.multiselect("Lead Status", store.filters.values("Lead Status"), default=store.filters.values("Lead Status"))
+        industry_filter = st.multiselect("Industry", store.filters.values("Industry"), default=store.filters.values("Industry"))
     
     with col2:
-        stage_filter = st.multiselect("Deal Stage", df["Deal Stage"].unique(), default=df["Deal Stage"].unique())
-        priority_filter = st.multiselect("Priority", df["Priority"].unique(), default=df["Priority"].unique())
+        stage_filter = st.multiselect("Deal Stage", store.filters.values("Deal Stage"), default=store.filters.values("Deal Stage"))
+        priority_filter = st.multiselect("Priority", store.filters.values("Priority"), default=store.filters.values("Priority"))
     
     with col3:
         score_range = st.slider("Lead Score Range", 0, 100, (0, 100))
-        owner_filter = st.multiselect("Owner", df["Owner"].unique(), default=df["Owner"].unique())
+        owner_filter = st.multiselect("Owner", store.filters.values("Owner"), default=store.filters.values("Owner"))
     
     with col4:
         # Date filters
@@ -1684,46 +3750,36 @@ else:
         date_to = st.date_input("Added Before", datetime.now())
 
     # Apply all filters
-    filtered_df = df[
-        (df["Lead Status"].isin(status_filter)) &
-        (df["Industry"].isin(industry_filter)) &
-        (df["Deal Stage"].isin(stage_filter)) &
-        (df["Priority"].isin(priority_filter)) &
+    filter_mask = store.filters.select({
+        "Lead Status": status_filter,
+        "Industry": industry_filter,
+        "Deal Stage": stage_filter,
+        "Priority": priority_filter,
+        "Owner": owner_filter,
+    }, size=len(df)) & store.date_added.mask_between(date_from, date_to, size=len(df)) & (
         (df["Lead Score"] >= score_range[0]) &
-        (df["Lead Score"] <= score_range[1]) &
-        (df["Owner"].isin(owner_filter)) &
-        (pd.to_datetime(df["Date Added"]).dt.date >= date_from) &
-        (pd.to_datetime(df["Date Added"]).dt.date <= date_to)
-    ]
+        (df["Lead Score"] <= score_range[1])
+    ).to_numpy(dtype=bool, na_value=False)
+    rows = filter_mask
 
     # Search functionality
     search_col1, search_col2 = st.columns([3, 1])
     with search_col1:
         search_term = st.text_input("🔍 Search prospects...", placeholder="Search by name, company, email, or notes")
     with search_col2:
-        sort_by = st.selectbox("Sort by", ["Lead Score", "Date Added", "Name", "Company", "Deal Value"])
+        sort_by = st.selectbox("Sort by", list(GRID_SORT_KEYS))
 
     if search_term:
-        search_mask = (
-            filtered_df["Name"].str.contains(search_term, case=False, na=False) |
-            filtered_df["Company"].str.contains(search_term, case=False, na=False) |
-            filtered_df["Email"].str.contains(search_term, case=False, na=False) |
-            filtered_df["Notes"].str.contains(search_term, case=False, na=False)
-        )
-        filtered_df = filtered_df[search_mask]
+        rows = store.search(search_term, filter_mask, groups=("contact", "notes"))
 
-    # Sort results
-    if sort_by == "Lead Score":
-        filtered_df = filtered_df.sort_values("Lead Score", ascending=False)
-    elif sort_by == "Date Added":
-        filtered_df = filtered_df.sort_values("Date Added", ascending=False)
-    else:
-        filtered_df = filtered_df.sort_values(sort_by)
+    # Sort results by one pass over the cached sort order
+    order = store.cached(("sort_order", sort_by), lambda data: build_sort_order(data, sort_by))
+    rows = sorted_rows(order, rows, len(df))
 
-    st.write(f"**Showing {len(filtered_df)} of {len(df)} prospects**")
+    st.write(f"**Showing {len(rows)} of {len(df)} prospects**")
 
     # Column selector
-    all_columns = df.columns.tolist()
+    all_columns = export_columns(df).columns.tolist()
     default_columns = [
         "Prospect ID", "Name", "Company", "Title / Role", "Industry", 
         "Lead Status", "Deal Stage", "Lead Score", "Priority", "Owner", 
@@ -1737,39 +3793,22 @@ else:
     )
 
     if selected_columns:
-        # Enhanced dataframe display
-        display_df = filtered_df[selected_columns].copy()
-        
-        # Add styling based on priority and status
-        def highlight_priority(row):
-            if 'Priority' in row:
-                if row['Priority'] == 'High':
-                    return ['background-color: #ffebee'] * len(row)
-                elif row['Priority'] == 'Medium':
-                    return ['background-color: #fff3e0'] * len(row)
-                else:
-                    return ['background-color: #e8f5e8'] * len(row)
-            return [''] * len(row)
-        
-        st.dataframe(
-            display_df.style.apply(highlight_priority, axis=1),
-            use_container_width=True,
-            height=600
-        )
+        # Enhanced dataframe display, with rows highlighted by priority
+        page_rows = show_prospect_grid(df, rows, selected_columns, key="advanced", height=600, styled=True)
 
         # Prospect detail view
-        if not filtered_df.empty:
+        if len(page_rows):
             st.markdown("---")
             st.subheader("Prospect Details")
             
             selected_prospect_id = st.selectbox(
                 "View Detailed Profile",
-                filtered_df["Prospect ID"].tolist(),
-                format_func=lambda x: f"{x} - {filtered_df[filtered_df['Prospect ID']==x]['Name'].iloc[0]} ({filtered_df[filtered_df['Prospect ID']==x]['Company'].iloc[0]})"
+                df["Prospect ID"].iloc[page_rows].tolist(),
+                format_func=lambda x: f"{x} - {df.at[store.row_for(x), 'Name']} ({df.at[store.row_for(x), 'Company']})"
             )
             
             if selected_prospect_id:
-                prospect = filtered_df[filtered_df["Prospect ID"] == selected_prospect_id].iloc[0]
+                prospect = df.loc[store.row_for(selected_prospect_id)]
                 
                 # Detailed prospect view
                 col1, col2, col3 = st.columns(3)
@@ -1796,21 +3835,21 @@ else:
                     st.write(f"**Priority:** {prospect['Priority']}")
                     st.write(f"**Owner:** {prospect['Owner']}")
                     st.write(f"**Source:** {prospect['Source']}")
-                    st.write(f"**Date Added:** {prospect['Date Added']}")
+                    st.write(f"**Date Added:** {format_date(prospect['Date Added'])}")
                     st.write(f"**Deal Value:** {prospect['Deal Value'] or 'TBD'}")
                     st.write(f"**Budget:** {prospect.get('Budget', 'Unknown')}")
                 
                 with col3:
                     st.markdown("**Company Details**")
                     st.write(f"**Size:** {prospect['Company Size']}")
-                    st.write(f"**Employees:** {prospect.get('Employee Count', 'Unknown')}")
+                    st.write(f"**Employees:** {prospect['Employee Count'] if pd.notna(prospect['Employee Count']) else 'Unknown'}")
                     st.write(f"**Revenue:** {prospect.get('Revenue', 'Unknown')}")
                     
                     st.markdown("**Engagement**")
                     st.write(f"**Emails Opened:** {prospect['Opened Emails']}")
                     st.write(f"**Replies:** {prospect['Replies']}")
-                    st.write(f"**Last Contact:** {prospect.get('Last Contact', 'Never')}")
-                    st.write(f"**Next Follow Up:** {prospect.get('Next Follow Up', 'Not scheduled')}")
+                    st.write(f"**Last Contact:** {format_date(prospect['Last Contact'], 'Never')}")
+                    st.write(f"**Next Follow Up:** {format_date(prospect['Next Follow Up'], 'Not scheduled')}")
 
                 # Pain points and solution interest
                 st.markdown("---")
@@ -1863,13 +3902,7 @@ else:
         
         with col2:
             if st.button("📊 Export Selected"):
-                csv_data = filtered_df.to_csv(index=False).encode("utf-8")
-                st.download_button(
-                    "Download Filtered Data",
-                    csv_data,
-                    f"filtered_prospects_{datetime.now().strftime('%Y%m%d')}.csv",
-                    "text/csv"
-                )
+                export_download("Download Filtered Data", export_chunks(df, rows), "CSV", f"filtered_prospects_{datetime.now().strftime('%Y%m%d')}")
         
         with col3:
             if st.button("🏷️ Bulk Tag"):